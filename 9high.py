@@ -1,47 +1,59 @@
-import os
-import json
-import glob
+import sys
 import csv
+import numpy as np
+from adjust import load_view
+from barstore import BAR_DIR, parse_file_name
+from catalog import open_catalog
+from panel import open_panel
+from patterns import NINE_DOWN_DAYS, is_nine_downward, nine_down_signal
+from universe_filter import tradable_files
 
-daylength = 12
-def is_nine_downward(closes):
-    # closes: 最近daylength天的收盘价，长度必须为daylength
-    # 统计最后9天中有多少天是下跌的
-    down_days = 0
-    for i in range(-11, 0):  # closes[-9]~closes[-2]与前一天比较
-        if closes[i] < closes[i-1]:
-            down_days += 1
-    return down_days >= 9
+daylength = NINE_DOWN_DAYS  # 判断逻辑在 patterns.py，scan.py 可与其他形态一起扫描
 
-def main():
-    data_dir = "data"
+def scan_panel(panel):
+    # 直接在面板最近daylength天的收盘价视图上一次性判断全部股票
+    hits = np.flatnonzero(nine_down_signal(panel.window("close", daylength))[-1])
+    return [(panel.symbols[j]["name"], panel.symbols[j]["code"]) for j in hits]
+
+def scan_history(panel):
+    # 整个面板每只股票每一天的信号一次算出，用于回测信号的历史表现
+    signal = nine_down_signal(panel.window("close", len(panel.dates)))
+    days, cols = np.nonzero(signal)
+    return [(str(panel.dates[i]), panel.symbols[j]["name"], panel.symbols[j]["code"]) for i, j in zip(days, cols)]
+
+def scan_files():
     result = []
-    for file_path in glob.glob(os.path.join(data_dir, "*.json")):
+    catalog = open_catalog(BAR_DIR)
+    for file_path in tradable_files(BAR_DIR):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                stock_data = json.load(f)
-            if not isinstance(stock_data, list) or len(stock_data) < daylength:
-                continue
-            lastdaylength = stock_data[-daylength:]
-            closes = []
-            for item in lastdaylength:
-                try:
-                    closes.append(round(float(item["close"]), 2))
-                except (ValueError, TypeError, KeyError):
-                    break  # 有异常直接跳过该股票
-            if len(closes) != daylength:
+            # 只读最后 daylength 根K线；前复权，避免除权缺口被当成下跌
+            bars = load_view(file_path, catalog=catalog, tail=daylength)
+            if len(bars) < daylength:
                 continue
+            closes = np.round(bars["close"][-daylength:], 2)  # 入库时已检查，没有缺失值
             if is_nine_downward(closes):
-                filename = os.path.basename(file_path)
-                if '-' in filename:
-                    stock_name, stock_code = filename.replace('.json', '').rsplit('-', 1)
-                else:
-                    stock_name = filename.replace('.json', '')
-                    stock_code = ""
-                result.append((stock_name, stock_code))
+                result.append(parse_file_name(file_path))
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
             continue
+    return result
+
+def main():
+    # 加 --panel 参数时使用预先构建的全市场面板（python panel.py）
+    # 加 --history 时输出面板全部历史日期上的信号（9high-history.csv）
+    panel = open_panel() if "--panel" in sys.argv or "--history" in sys.argv else None
+    if panel is not None and "--history" in sys.argv:
+        history = scan_history(panel)
+        with open("9high-history.csv", "w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["date", "stock_name", "stock_code"])
+            writer.writerows(history)
+        print(f"已输出 {len(history)} 条历史信号到 9high-history.csv")
+        return
+    if panel is not None:
+        result = scan_panel(panel)
+    else:
+        result = scan_files()
 
     # 输出到csv
     with open("9high-result.csv", "w", newline='', encoding="utf-8") as f:
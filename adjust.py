@@ -0,0 +1,151 @@
+import os
+import sys
+import importlib
+import numpy as np
+from barstore import ADJUST_FORWARD, ADJUST_RAW, BAR_DIR, load_bars, load_tail
+from catalog import full_code, open_catalog
+
+FACTOR_DIR = "factors"
+FACTOR_FIELDS = "code,dividOperateDate,foreAdjustFactor,backAdjustFactor,adjustFactor"
+FACTOR_START = "1990-12-19"  # 沪市开市，查询全部历史复权因子
+
+# 每只股票一个复权因子表，按除权除息日升序，通常只有几十行
+FACTOR_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("fore", "<f8"), ("back", "<f8"), ("adjust", "<f8"),
+])
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def factors_from_rows(rows, fields):
+    """query_adjust_factor 结果集转复权因子表"""
+    factors = np.empty(len(rows), dtype=FACTOR_DTYPE)
+    if not rows:
+        return factors
+    columns = dict(zip(fields, zip(*rows)))
+    factors["date"] = np.asarray(columns["dividOperateDate"], dtype="datetime64[D]")
+    for name, field in (("fore", "foreAdjustFactor"), ("back", "backAdjustFactor"), ("adjust", "adjustFactor")):
+        col = np.asarray(columns[field], dtype=object)
+        col[col == ''] = 'nan'
+        factors[name] = col.astype(str).astype("<f8")
+    return factors[np.argsort(factors["date"], kind="stable")]
+
+
+def factor_path(stock_code, bar_dir=BAR_DIR):
+    return os.path.join(bar_dir, FACTOR_DIR, f"{full_code(stock_code)}.npy")
+
+
+def load_factors(stock_code, bar_dir=BAR_DIR):
+    path = factor_path(stock_code, bar_dir)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=FACTOR_DTYPE)
+    return np.load(path)
+
+
+def write_factors(stock_code, factors, bar_dir=BAR_DIR):
+    """复权因子表整体替换（原子写入）；除权除息只需重写这个小文件，K线不动"""
+    path = factor_path(stock_code, bar_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(factors, dtype=FACTOR_DTYPE))
+    os.replace(tmp_path, path)
+    return path
+
+
+def query_factor_rows(bs, stock_code, end_date=None):
+    """查询一只股票的全部复权因子，返回 (rows, fields)"""
+    rs = bs.query_adjust_factor(code=full_code(stock_code), start_date=FACTOR_START, end_date=end_date)
+    if rs.error_code != '0':
+        raise RuntimeError(f"{rs.error_code} {rs.error_msg}")
+    rows = []
+    while (rs.error_code == '0') & rs.next():
+        rows.append(rs.get_row_data())
+    return rows, rs.fields
+
+
+def price_factors(dates, factors, mode="fore"):
+    """
+    每个日期对应的复权系数（向量化，searchsorted 找到不晚于该日的最近一次除权除息）
+    后复权系数即 backAdjustFactor，首次除权前为 1；
+    前复权系数 = 后复权系数 / 最新后复权系数（与 baostock 的 foreAdjustFactor 一致，最新一段为 1）
+    """
+    if mode not in ("fore", "back"):
+        raise ValueError(f"不支持的复权方式: {mode}")
+    if not len(factors):
+        return np.ones(len(dates))
+    idx = np.searchsorted(factors["date"], dates, side="right") - 1
+    back = np.where(idx >= 0, factors["back"][np.maximum(idx, 0)], 1.0)
+    if mode == "back":
+        return back
+    return back / factors["back"][-1]
+
+
+def adjust_prices(bars, factors, mode="fore"):
+    """不复权K线（日线或分钟线）乘以复权系数得到前/后复权K线，成交量和成交额不变"""
+    dates = bars["date"] if "date" in bars.dtype.names else bars["ts"].astype("datetime64[D]")
+    factor = price_factors(dates, factors, mode)
+    adjusted = bars.copy()
+    for name in PRICE_FIELDS:
+        adjusted[name] = bars[name] * factor
+    return adjusted
+
+
+def load_view(file_path, mode="fore", bar_dir=BAR_DIR, catalog=None, tail=None):
+    """
+    按复权方式读取K线文件：
+    不复权存储的股票在读取时乘复权因子；旧的前复权存储只能给出前复权视图
+    mode: "fore" 前复权 / "back" 后复权 / "none" 不复权
+    tail: 只读最后 tail 行（复权系数按日期逐行计算，与读全量再截取结果相同）
+    """
+    bars = load_tail(file_path, tail) if tail else load_bars(file_path)
+    entry = (catalog or open_catalog(bar_dir)).entry_for_file(file_path)
+    stored = entry.get("adjust", ADJUST_FORWARD) if entry else ADJUST_FORWARD
+    if stored == ADJUST_RAW:
+        if mode == "none":
+            return bars
+        return adjust_prices(bars, load_factors(entry["code"], bar_dir), mode)
+    if mode != "fore":
+        raise ValueError(f"{os.path.basename(file_path)} 存储的是前复权数据，无法得到 {mode} 视图，请重新下载不复权数据")
+    return bars
+
+
+def load_adjusted(stock_code, mode="fore", bar_dir=BAR_DIR):
+    """按股票代码读取指定复权方式的日K线"""
+    from catalog import find_bar_file
+    return load_view(find_bar_file(stock_code, bar_dir), mode, bar_dir)
+
+
+def update_factors(codes=None, backend="bscache", bar_dir=BAR_DIR):
+    """
+    刷新复权因子（默认为目录中所有不复权存储的股票）
+    除权除息后只需运行这一步，无需重新下载K线
+    """
+    if codes is None:
+        codes = [entry["code"] for entry in open_catalog(bar_dir) if entry.get("adjust") == ADJUST_RAW]
+    bs = importlib.import_module(backend)
+    bs.login()
+    changed = 0
+    try:
+        for i, code in enumerate(codes, 1):
+            try:
+                rows, fields = query_factor_rows(bs, code)
+            except RuntimeError as e:
+                print(f"{code} 复权因子查询失败: {e}")
+                continue
+            factors = factors_from_rows(rows, fields)
+            old = load_factors(code, bar_dir)
+            if len(old) != len(factors) or not (old == factors).all():
+                write_factors(code, factors, bar_dir)
+                changed += 1
+            if i % 500 == 0:
+                print(f"已检查 {i} / {len(codes)} 只股票")
+    finally:
+        bs.logout()
+    print(f"复权因子已刷新，{len(codes)} 只股票中 {changed} 只有变化")
+    return changed
+
+
+if __name__ == "__main__":
+    update_factors(sys.argv[1:] or None)
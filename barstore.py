@@ -0,0 +1,282 @@
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+
+DATA_DIR = "data"   # 旧版 JSON 数据目录（<名称>-<代码>.json）
+BAR_DIR = "bars"    # 二进制K线目录（<名称>-<代码>.npy）
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "amount")
+
+# 每只股票一个文件，按列类型存储：日期为 datetime64[D]，价格/成交量/成交额为 float64
+# 缺失字段（例如只下载了 date,open,high,low,close）以 NaN 填充
+BAR_DTYPE = np.dtype([("date", "datetime64[D]")] + [(name, "<f8") for name in BAR_FIELDS])
+
+# 日常更新只把新K线以原始定长记录追加到 <文件名>.journal，
+# 读取时与主文件合并；日志达到 COMPACT_ROWS 行时合并回主文件
+# 复权方式标记（与 baostock adjustflag 一致），记录在股票目录里：
+# 新下载的K线一律不复权存储，读取时再乘复权因子；data/ 转换来的旧数据是前复权
+ADJUST_RAW = "3"
+ADJUST_FORWARD = "2"
+
+JOURNAL_SUFFIX = ".journal"
+COMPACT_ROWS = 64
+
+
+def bar_file_name(stock_name, stock_code):
+    """生成K线文件名，代码只保留数字部分，与旧的 JSON 文件名规则一致"""
+    return f"{stock_name}-{stock_code.split('.')[-1]}.npy"
+
+
+def parse_file_name(file_path):
+    """从文件名解析 (股票名称, 股票代码)"""
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    if '-' in base:
+        stock_name, stock_code = base.rsplit('-', 1)
+    else:
+        stock_name = base
+        stock_code = ""
+    return stock_name, stock_code
+
+
+def _to_float(values):
+    # baostock 返回的字段都是字符串，空串表示缺失
+    col = np.asarray(values, dtype=object)
+    col[(col == '') | (col == None)] = 'nan'  # noqa: E711
+    return col.astype(str).astype("<f8")
+
+
+def bars_from_columns(columns):
+    """由 {字段: 字符串/数值序列} 构造K线数组，按日期升序"""
+    n = len(columns["date"])
+    bars = np.empty(n, dtype=BAR_DTYPE)
+    bars["date"] = np.asarray(columns["date"], dtype="datetime64[D]")
+    for name in BAR_FIELDS:
+        if name in columns:
+            bars[name] = _to_float(columns[name])
+        else:
+            bars[name] = np.nan
+    if n > 1 and np.any(bars["date"][1:] < bars["date"][:-1]):
+        bars = bars[np.argsort(bars["date"], kind="stable")]
+    return bars
+
+
+def bars_from_rows(rows, fields):
+    """baostock 结果集（rs.get_row_data() 列表 + rs.fields）转K线数组"""
+    if not rows:
+        return np.empty(0, dtype=BAR_DTYPE)
+    columns = dict(zip(fields, zip(*rows)))
+    return bars_from_columns(columns)
+
+
+def bars_from_records(records):
+    """旧版 JSON 记录列表（[{date, open, ...}, ...]）转K线数组"""
+    if not records:
+        return np.empty(0, dtype=BAR_DTYPE)
+    columns = {key: [item.get(key, '') for item in records] for key in records[0]}
+    return bars_from_columns(columns)
+
+
+def bars_to_frame(bars):
+    """K线数组转 DataFrame，去掉全为 NaN 的字段（即原始数据中没有的字段）"""
+    df = pd.DataFrame({name: bars[name] for name in BAR_DTYPE.names})
+    df["date"] = pd.to_datetime(df["date"])
+    empty = [name for name in BAR_FIELDS if df[name].isna().all()]
+    return df.drop(columns=empty)
+
+
+def journal_path(file_path):
+    return os.path.splitext(file_path)[0] + JOURNAL_SUFFIX
+
+
+def write_bars(stock_name, stock_code, bars, bar_dir=BAR_DIR, catalog=None, adjust=None):
+    """
+    写入（覆盖）一只股票的K线文件，先写临时文件再替换，避免读到半个文件
+    传入 catalog 时同步更新股票目录（调用方负责最后 catalog.save()），adjust 为这批K线的复权方式
+    """
+    os.makedirs(bar_dir, exist_ok=True)
+    file_path = os.path.join(bar_dir, bar_file_name(stock_name, stock_code))
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+    os.replace(tmp_path, file_path)
+    # 主文件已包含全部数据，旧日志作废
+    if os.path.exists(journal_path(file_path)):
+        os.remove(journal_path(file_path))
+    if catalog is not None:
+        catalog.record(stock_name, stock_code, bars, file_path, adjust=adjust)
+    return file_path
+
+
+def _read_journal(file_path, after_date=None):
+    path = journal_path(file_path)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=BAR_DTYPE)
+    with open(path, "rb") as f:
+        raw = f.read()
+    # 末尾不完整的记录（写入中途崩溃）直接丢弃
+    raw = raw[:len(raw) - len(raw) % BAR_DTYPE.itemsize]
+    journal = np.frombuffer(raw, dtype=BAR_DTYPE)
+    if after_date is not None:
+        # 合并后崩溃未删除的日志行已在主文件中，按日期去掉
+        journal = journal[journal["date"] > after_date]
+    if len(journal) > 1:
+        # 日期必须严格递增，重复追加的行只保留第一次
+        keep = np.ones(len(journal), dtype=bool)
+        keep[1:] = journal["date"][1:] > np.maximum.accumulate(journal["date"])[:-1]
+        journal = journal[keep]
+    return journal
+
+
+def stored_last_date(file_path):
+    """
+    磁盘上实际存储的最后日期：追加日志最后一条完整记录，没有日志时取主文件最后一行
+    只读一条记录，不依赖可能尚未保存的股票目录
+    """
+    path = journal_path(file_path)
+    if os.path.exists(path):
+        size = os.path.getsize(path) // BAR_DTYPE.itemsize * BAR_DTYPE.itemsize
+        if size:
+            with open(path, "rb") as f:
+                f.seek(size - BAR_DTYPE.itemsize)
+                last = np.frombuffer(f.read(BAR_DTYPE.itemsize), dtype=BAR_DTYPE)["date"][0]
+            bars = np.load(file_path, mmap_mode="r")
+            return max(last, bars["date"][-1]) if len(bars) else last
+    bars = np.load(file_path, mmap_mode="r")
+    return bars["date"][-1] if len(bars) else None
+
+
+def load_bars(file_path):
+    """读取一只股票的K线数组（主文件 + 追加日志）"""
+    bars = np.load(file_path)
+    journal = _read_journal(file_path, bars["date"][-1] if len(bars) else None)
+    if len(journal):
+        bars = np.concatenate([bars, journal])
+    return bars
+
+
+def load_tail(file_path, n):
+    """
+    只读最后 n 行：主文件以内存映射打开，只有末尾切片会真正读盘，再拼上追加日志
+    每日扫描只需要最近几十根K线时，开销与历史长度无关
+    """
+    bars = np.load(file_path, mmap_mode="r")
+    journal = _read_journal(file_path, bars["date"][-1] if len(bars) else None)
+    if len(journal) >= n:
+        return journal[len(journal) - n:].copy()
+    head = np.array(bars[max(len(bars) - (n - len(journal)), 0):])
+    del bars  # 及时释放映射（Windows 下映射未关闭时文件不能被替换）
+    if len(journal):
+        head = np.concatenate([head, journal])
+    return head
+
+
+def append_bars(stock_name, stock_code, new_bars, last_date, bar_dir=BAR_DIR, catalog=None):
+    """
+    只追加日期晚于已存储最后日期的新K线，不读写历史数据
+    文件已存在时以磁盘上的最后日期为准（目录可能在上次追加后没来得及保存），
+    last_date 只在文件不存在时使用
+    返回实际追加的行数
+    """
+    file_path = os.path.join(bar_dir, bar_file_name(stock_name, stock_code))
+    catalog_behind = False
+    if os.path.exists(file_path):
+        stored = stored_last_date(file_path)
+        catalog_behind = stored is not None and (last_date is None or stored > np.datetime64(last_date, "D"))
+        last_date = stored
+    if last_date is not None:
+        new_bars = new_bars[new_bars["date"] > np.datetime64(last_date, "D")]
+    if not len(new_bars):
+        if catalog_behind and catalog is not None:
+            catalog.record(stock_name, stock_code, load_bars(file_path), file_path)
+        return 0
+    if not os.path.exists(file_path):
+        write_bars(stock_name, stock_code, new_bars, bar_dir, catalog)
+        return len(new_bars)
+    path = journal_path(file_path)
+    with open(path, "ab") as f:
+        f.write(np.ascontiguousarray(new_bars, dtype=BAR_DTYPE).tobytes())
+    if catalog is not None:
+        if catalog_behind:
+            # 目录落后于磁盘（上次追加后未保存目录），按实际文件重新记录
+            catalog.record(stock_name, stock_code, load_bars(file_path), file_path)
+        else:
+            catalog.record_append(stock_name, stock_code, new_bars, file_path)
+    if os.path.getsize(path) >= COMPACT_ROWS * BAR_DTYPE.itemsize:
+        compact_bars(file_path)
+    return len(new_bars)
+
+
+def compact_bars(file_path):
+    """把追加日志合并回主文件"""
+    if not os.path.exists(journal_path(file_path)):
+        return False
+    bars = load_bars(file_path)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, bars)
+    os.replace(tmp_path, file_path)
+    os.remove(journal_path(file_path))
+    return True
+
+
+def compact_all(bar_dir=BAR_DIR):
+    """合并目录下全部追加日志"""
+    compacted = sum(compact_bars(file_path) for file_path in iter_bar_files(bar_dir))
+    print(f"已合并 {compacted} 个追加日志")
+    return compacted
+
+
+def iter_bar_files(bar_dir=BAR_DIR):
+    """按文件名排序返回全部K线文件"""
+    return sorted(glob.glob(os.path.join(bar_dir, "*.npy")))
+
+
+def find_bar_file(stock_code, bar_dir=BAR_DIR):
+    """按代码精确匹配K线文件（代码可以带 sh./sz. 前缀）"""
+    code = stock_code.split('.')[-1]
+    matches = sorted(glob.glob(os.path.join(bar_dir, f"*-{code}.npy")))
+    if not matches:
+        raise FileNotFoundError(f"未找到股票代码 {stock_code} 的数据文件")
+    return matches[0]
+
+
+def convert_json_dir(data_dir=DATA_DIR, bar_dir=BAR_DIR):
+    """
+    一次性把 data/ 下的旧 JSON 文件转换为二进制K线文件
+    与下载、更新入库一样先经过质量检查（缺失价格的行会让扫描的前缀最小值等计算失效）
+    """
+    from catalog import SymbolCatalog, full_code
+    from quality import QualityReport, check_bars
+
+    json_files = sorted(glob.glob(os.path.join(data_dir, "*.json")))
+    print(f"找到 {len(json_files)} 个 JSON 文件")
+    catalog = SymbolCatalog(bar_dir)
+    report = QualityReport(bar_dir)
+    converted = 0
+    for file_path in json_files:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            if not isinstance(records, list):
+                print(f"跳过无效数据: {file_path}")
+                continue
+            stock_name, stock_code = parse_file_name(file_path)
+            bars = check_bars(full_code(stock_code), bars_from_records(records), report)
+            write_bars(stock_name, stock_code, bars, bar_dir, catalog, ADJUST_FORWARD)
+            converted += 1
+        except (json.JSONDecodeError, ValueError, OSError) as e:
+            print(f"转换 {file_path} 时出错: {e}")
+    catalog.save()
+    report.save()
+    print(f"转换完成，共写入 {converted} 个K线文件到 {bar_dir}/，有问题 {len(report.flagged())} 只（详见 {report.path}）")
+    return converted
+
+
+if __name__ == "__main__":
+    import sys
+    if "--compact" in sys.argv:
+        compact_all()
+    else:
+        convert_json_dir()
@@ -0,0 +1,163 @@
+# baostock 查询的本地磁盘缓存，用法与 baostock 完全相同：
+#
+#     import bscache as bs
+#     bs.login()
+#     rs = bs.query_history_k_data_plus("sh.600000", "date,close", start_date=..., end_date=...)
+#
+# 按完整参数做键；结束日期在今天之前的不复权（adjustflag="3"）K线视为不可变，永久缓存，
+# 前/后复权K线会随每次除权除息整体改写、复权因子同样会变，和包含今天（或未指定结束日期）的查询一样 CACHE_TTL 秒后过期；
+# 缓存总大小超过 CACHE_MAX_BYTES 时按最近使用时间淘汰
+import os
+import gzip
+import json
+import time
+import hashlib
+from datetime import datetime
+import baostock as _bs
+
+CACHE_DIR = os.environ.get("BSCACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("BSCACHE_MAX_MB", "512")) * 1024 * 1024
+CACHE_TTL = int(os.environ.get("BSCACHE_TTL", "1800"))
+EVICT_EVERY = 100  # 每写入多少条检查一次总大小
+
+_writes = 0
+
+
+class CachedResultSet:
+    """与 baostock ResultData 接口一致的结果集"""
+
+    def __init__(self, fields, rows, error_code="0", error_msg="success"):
+        self.fields = fields
+        self.rows = rows
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self._cursor = -1
+
+    def next(self):
+        self._cursor += 1
+        return self._cursor < len(self.rows)
+
+    def get_row_data(self):
+        return self.rows[self._cursor]
+
+    def get_data(self):
+        import pandas as pd
+        return pd.DataFrame(self.rows, columns=self.fields)
+
+
+def _cache_path(func_name, params):
+    key = json.dumps([func_name, params], sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, digest[:2], digest + ".json.gz")
+
+
+def _is_closed(end_date):
+    """结束日期早于今天的区间数据不会再变"""
+    return bool(end_date) and end_date < datetime.now().strftime("%Y-%m-%d")
+
+
+def _read(path, closed):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if not closed and time.time() - mtime > CACHE_TTL:
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 记录最近使用时间，供 LRU 淘汰；未封闭区间靠创建时间判断过期，不更新
+    if closed:
+        os.utime(path)
+    return CachedResultSet(payload["fields"], payload["rows"])
+
+
+def _write(path, fields, rows):
+    global _writes
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump({"fields": fields, "rows": rows}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    _writes += 1
+    if _writes % EVICT_EVERY == 0:
+        evict()
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """按最近使用时间淘汰，直到缓存总大小不超过 max_bytes"""
+    files = []
+    for root, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _cached_query(func_name, params, end_date):
+    closed = _is_closed(end_date)
+    path = _cache_path(func_name, params)
+    rs = _read(path, closed)
+    if rs is not None:
+        return rs
+    real = getattr(_bs, func_name)(**params)
+    if real.error_code != "0":
+        return real  # 出错的结果不缓存
+    rows = []
+    while (real.error_code == "0") & real.next():
+        rows.append(real.get_row_data())
+    if real.error_code != "0":
+        return CachedResultSet(real.fields, rows, real.error_code, real.error_msg)
+    _write(path, real.fields, rows)
+    return CachedResultSet(real.fields, rows)
+
+
+def query_history_k_data_plus(code, fields, start_date=None, end_date=None, frequency="d", adjustflag="3"):
+    params = {"code": code, "fields": fields, "start_date": start_date, "end_date": end_date,
+              "frequency": frequency, "adjustflag": adjustflag}
+    # 只有不复权的历史区间不会再变；前/后复权价格在除权除息后整段改变，按未封闭区间处理
+    return _cached_query("query_history_k_data_plus", params, end_date if adjustflag == "3" else None)
+
+
+def query_all_stock(day=None):
+    return _cached_query("query_all_stock", {"day": day}, day)
+
+
+def query_trade_dates(start_date=None, end_date=None):
+    return _cached_query("query_trade_dates", {"start_date": start_date, "end_date": end_date}, end_date)
+
+
+def query_adjust_factor(code, start_date=None, end_date=None):
+    # 复权因子随除权除息变化，结束日期在今天之前也只缓存 CACHE_TTL
+    params = {"code": code, "start_date": start_date, "end_date": end_date}
+    return _cached_query("query_adjust_factor", params, None)
+
+
+def login(*args, **kwargs):
+    return _bs.login(*args, **kwargs)
+
+
+def logout(*args, **kwargs):
+    return _bs.logout(*args, **kwargs)
+
+
+def __getattr__(name):
+    # 其余接口直接转发给 baostock
+    return getattr(_bs, name)
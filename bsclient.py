@@ -0,0 +1,139 @@
+import time
+import random
+import importlib
+
+# baostock 错误码：会话过期（需要重新登录）
+NOT_LOGGED_IN = "10001001"
+
+
+class QueryError(RuntimeError):
+    """重试后仍然失败的查询；消息以错误码开头，errors 为每次尝试的错误码"""
+
+    def __init__(self, error_code, error_msg, errors):
+        super().__init__(f"{error_code} {error_msg}")
+        self.error_code = error_code
+        self.errors = errors
+
+
+class TokenBucket:
+    """
+    令牌桶限速：平均每秒 rate 次，允许 burst 次突发；rate 为 0 时不限速
+    adaptive 时按 AIMD 调整速率：出错降到 0.7 倍，连续成功缓慢回升到上限
+    """
+
+    def __init__(self, rate=0.0, burst=None, adaptive=True, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.adaptive = adaptive
+        self.min_rate = min(min_rate, rate) if rate else 0.0
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            self.updated = time.monotonic()
+            self.tokens = 1.0
+        self.tokens -= 1
+        return wait
+
+    def on_success(self):
+        if self.adaptive and self.rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_error(self):
+        if self.adaptive and self.rate:
+            self.rate = max(self.min_rate, self.rate * 0.7)
+
+
+class BaostockClient:
+    """
+    baostock 查询的统一封装：令牌桶限速、指数退避加随机抖动重试、会话过期自动重新登录
+    backend 为 baostock 兼容模块名（baostock / bscache / fakebaostock）
+    多进程时每个进程各建一个客户端，rate 传总速率除以进程数
+    """
+
+    def __init__(self, backend="baostock", rate=0.0, burst=None, max_retries=3, backoff=0.5, max_backoff=30.0,
+                 adaptive=True):
+        self.bs = importlib.import_module(backend)
+        self.bucket = TokenBucket(rate, burst, adaptive)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.last_errors = []  # 最近一次查询中失败尝试的错误码，供统计
+        self.logins = 0
+
+    def login(self):
+        self.logins += 1
+        return self.bs.login()
+
+    def logout(self):
+        return self.bs.logout()
+
+    def backoff_delay(self, attempt):
+        """第 attempt 次失败后的等待：指数增长封顶，再取 [一半, 全部] 之间的随机值，避免多个进程同时重试"""
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def query(self, func_name, **params):
+        """调用查询接口并取完全部行，返回 (rows, fields)；重试用尽时抛出 QueryError"""
+        errors = []
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                rs = getattr(self.bs, func_name)(**params)
+                rows = []
+                while (rs.error_code == '0') & rs.next():
+                    rows.append(rs.get_row_data())
+                error_code, error_msg = rs.error_code, rs.error_msg
+            except Exception as e:  # 网络异常等直接抛出的错误
+                rows, error_code, error_msg = [], "exception", str(e)
+            if error_code == '0':
+                self.bucket.on_success()
+                self.last_errors = errors
+                return rows, rs.fields
+            errors.append(error_code)
+            if error_code == NOT_LOGGED_IN:
+                # 会话过期：重新登录后立即重试，不算限流
+                self.login()
+                continue
+            self.bucket.on_error()
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_delay(attempt))
+                self.logout()
+                self.login()
+        self.last_errors = errors
+        raise QueryError(error_code, error_msg, errors)
+
+    def query_history_k_data_plus(self, code, fields, start_date=None, end_date=None, frequency="d",
+                                  adjustflag="3"):
+        return self.query("query_history_k_data_plus", code=code, fields=fields, start_date=start_date,
+                          end_date=end_date, frequency=frequency, adjustflag=adjustflag)
+
+    def query_adjust_factor(self, code, start_date=None, end_date=None):
+        return self.query("query_adjust_factor", code=code, start_date=start_date, end_date=end_date)
+
+
+class DeadLetters:
+    """重试用尽的任务先放一边，主流程结束后再统一重试一轮"""
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, task, error):
+        self.items.append({"task": task, "error": str(error)})
+
+    def __len__(self):
+        return len(self.items)
+
+    def drain(self):
+        items, self.items = self.items, []
+        return items
@@ -0,0 +1,157 @@
+import os
+import json
+import numpy as np
+from barstore import ADJUST_FORWARD, BAR_DIR, BAR_FIELDS, iter_bar_files, journal_path, load_bars, parse_file_name
+from barstore import find_bar_file as find_bar_file_by_name
+
+CATALOG_FILE = "catalog.json"
+
+# 代码首位 -> 交易所（文件名里只有6位数字代码时使用）
+EXCHANGE_BY_PREFIX = {"6": "sh", "9": "sh", "0": "sz", "2": "sz", "3": "sz", "4": "bj", "8": "bj"}
+
+
+def full_code(stock_code):
+    """6位代码补全为 baostock 代码（如 601360 -> sh.601360），已有前缀的原样返回"""
+    if '.' in stock_code:
+        return stock_code
+    return f"{EXCHANGE_BY_PREFIX.get(stock_code[:1], 'sh')}.{stock_code}"
+
+
+class SymbolCatalog:
+    """
+    股票目录：baostock代码 -> 文件、名称、交易所、起止日期、行数、字段、复权方式
+    查找为字典 O(1)；批处理可以只看目录规划任务，不必打开任何数据文件
+    """
+
+    def __init__(self, bar_dir=BAR_DIR, load=True):
+        self.bar_dir = bar_dir
+        self.path = os.path.join(bar_dir, CATALOG_FILE)
+        self.entries = {}
+        self._by_number = {}
+        if load and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self._add(entry)
+
+    def _add(self, entry):
+        self.entries[entry["code"]] = entry
+        codes = self._by_number.setdefault(entry["code"].split('.')[-1], [])
+        if entry["code"] not in codes:
+            codes.append(entry["code"])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(sorted(self.entries.values(), key=lambda e: e["code"]))
+
+    def lookup(self, stock_code):
+        """按代码查找，代码可带或不带 sh./sz. 前缀；找不到返回 None"""
+        if '.' in stock_code:
+            return self.entries.get(stock_code)
+        codes = self._by_number.get(stock_code, [])
+        if len(codes) > 1:
+            raise ValueError(f"股票代码 {stock_code} 对应多个证券: {codes}，请带上交易所前缀")
+        return self.entries[codes[0]] if codes else None
+
+    def file_path(self, entry):
+        return os.path.join(self.bar_dir, entry["file"])
+
+    def entry_for_file(self, file_path):
+        """K线文件 -> 目录条目（按文件名里的6位代码查，再核对文件名）"""
+        file_name = os.path.basename(file_path)
+        _, stock_code = parse_file_name(file_name)
+        for code in self._by_number.get(stock_code, []):
+            if self.entries[code]["file"] == file_name:
+                return self.entries[code]
+        return None
+
+    def record(self, stock_name, stock_code, bars, file_path, remove_stale=True, adjust=None):
+        """写入K线文件后更新对应条目；adjust 为空时沿用原条目的复权方式（旧数据为前复权）"""
+        code = full_code(stock_code)
+        old = self.entries.get(code)
+        if remove_stale and old and old["file"] != os.path.basename(file_path):
+            # 名称变化（例如戴帽摘帽）导致文件名变化，删除旧文件
+            old_path = self.file_path(old)
+            for path in (old_path, journal_path(old_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+        entry = {
+            "code": code,
+            "name": stock_name,
+            "exchange": code.split('.')[0],
+            "file": os.path.basename(file_path),
+            "first_date": str(bars["date"][0]) if len(bars) else None,
+            "last_date": str(bars["date"][-1]) if len(bars) else None,
+            "rows": int(len(bars)),
+            "fields": [name for name in BAR_FIELDS if len(bars) and not np.isnan(bars[name]).all()],
+            "adjust": adjust or (old.get("adjust") if old else None) or ADJUST_FORWARD,
+        }
+        self._add(entry)
+        return entry
+
+    def record_append(self, stock_name, stock_code, new_bars, file_path):
+        """追加新K线后更新对应条目（只用新行，不读历史）"""
+        entry = self.entries.get(full_code(stock_code))
+        if entry is None:
+            return self.record(stock_name, stock_code, load_bars(file_path), file_path)
+        if entry["first_date"] is None:
+            entry["first_date"] = str(new_bars["date"][0])
+        entry["last_date"] = str(new_bars["date"][-1])
+        entry["rows"] += int(len(new_bars))
+        entry["fields"] = [name for name in BAR_FIELDS
+                           if name in entry["fields"] or not np.isnan(new_bars[name]).all()]
+        return entry
+
+    def save(self):
+        """原子写入目录文件"""
+        os.makedirs(self.bar_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+_opened = {}
+
+
+def open_catalog(bar_dir=BAR_DIR):
+    """打开目录；同一进程内按文件修改时间缓存，反复查找不会重复解析"""
+    path = os.path.join(bar_dir, CATALOG_FILE)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cached = _opened.get(bar_dir)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, SymbolCatalog(bar_dir))
+        _opened[bar_dir] = cached
+    return cached[1]
+
+
+def rebuild_catalog(bar_dir=BAR_DIR):
+    """扫描K线目录重建目录文件（一次性，或目录文件丢失时使用）"""
+    # 交易所前缀和复权方式无法从文件判断，旧目录里有记录的沿用旧记录
+    old = SymbolCatalog(bar_dir)
+    catalog = SymbolCatalog(bar_dir, load=False)
+    for file_path in iter_bar_files(bar_dir):
+        stock_name, stock_code = parse_file_name(file_path)
+        if not stock_code:
+            continue
+        previous = old.entry_for_file(file_path)
+        if previous:
+            stock_code = previous["code"]
+        catalog.record(stock_name, stock_code, load_bars(file_path), file_path, remove_stale=False,
+                       adjust=previous.get("adjust") if previous else None)
+    catalog.save()
+    print(f"目录已重建: {catalog.path}，共 {len(catalog)} 只股票")
+    return catalog
+
+
+def find_bar_file(stock_code, bar_dir=BAR_DIR):
+    """通过目录 O(1) 查找K线文件；目录中没有时按文件名精确匹配"""
+    entry = open_catalog(bar_dir).lookup(stock_code)
+    if entry is not None:
+        return os.path.join(bar_dir, entry["file"])
+    return find_bar_file_by_name(stock_code, bar_dir)
+
+
+if __name__ == "__main__":
+    rebuild_catalog()
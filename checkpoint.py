@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from adjust import factor_path
+from barstore import BAR_DIR, bar_file_name
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+class IngestCheckpoint:
+    """
+    下载任务的持久化断点：记录已完成的股票及其日期范围、行数和文件
+    同一组下载参数（日期范围、字段、频率、复权方式）对应同一个断点文件，
+    每次写入都是 临时文件 + os.replace，进程中途被杀也不会留下半个断点
+    """
+
+    def __init__(self, job, bar_dir=BAR_DIR, save_every=50, save_interval=5.0):
+        self.job = job
+        self.bar_dir = bar_dir
+        job_id = hashlib.sha1(json.dumps(job, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self.path = os.path.join(bar_dir, CHECKPOINT_DIR, f"{job_id}.json")
+        self.completed = {}
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.completed = json.load(f)["completed"]
+
+    def _verify(self, done):
+        """检查已完成股票的文件是否完整（只读 .npy 头，不加载数据）"""
+        if done["status"] == "empty":
+            return True
+        file_path = os.path.join(self.bar_dir, done["file"])
+        try:
+            bars = np.load(file_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+        # 之后的日常更新可能已追加合并了新行，只要不少于断点记录即可
+        return len(bars) >= done["rows"]
+
+    def pending(self, tasks):
+        """过滤出还需要下载的任务；断点中记录但文件校验失败的股票重新下载"""
+        # 本任务的股票写盘中途被中断留下的临时文件（K线和复权因子）；
+        # 目录、质量报告等其他 *.tmp 可能正由别的进程写入，不能动
+        for task in tasks:
+            for path in (os.path.join(self.bar_dir, bar_file_name(task["code_name"], task["code"])),
+                         factor_path(task["code"], self.bar_dir)):
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+        broken = [code for code, done in self.completed.items() if not self._verify(done)]
+        for code in broken:
+            del self.completed[code]
+        if broken:
+            print(f"断点中有 {len(broken)} 只股票的文件不完整，将重新下载")
+        return [task for task in tasks if task["code"] not in self.completed]
+
+    def mark_done(self, code, rows=0, file_path=None):
+        self.completed[code] = {
+            "status": "ok" if rows else "empty",
+            "start_date": self.job["start_date"],
+            "end_date": self.job["end_date"],
+            "rows": int(rows),
+            "file": os.path.basename(file_path) if file_path else None,
+        }
+        self._unsaved += 1
+
+    def due(self):
+        """是否到了该落盘的时候（按完成数或时间间隔）"""
+        return self._unsaved >= self.save_every or (
+            self._unsaved and time.monotonic() - self._last_save >= self.save_interval)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"job": self.job, "completed": self.completed}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def clear(self):
+        self.completed = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
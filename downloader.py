@@ -0,0 +1,315 @@
+import os
+import sys
+import time
+import json
+import queue
+import argparse
+import multiprocessing as mp
+import numpy as np
+from adjust import FACTOR_START, factors_from_rows, write_factors
+from barstore import ADJUST_RAW, BAR_DIR, bars_from_rows, write_bars
+from bsclient import BaostockClient, DeadLetters, QueryError
+from catalog import open_catalog
+from checkpoint import IngestCheckpoint
+from quality import QualityReport, check_bars
+from telemetry import TELEMETRY_DIR, Telemetry
+from trading_calendar import TradingCalendar
+
+DEFAULT_FIELDS = "date,open,high,low,close,amount"
+DEFAULT_RATE = 40.0  # 合计每秒查询次数上限（每只股票两次查询：K线和复权因子）
+
+
+def _worker(worker_id, backend, task_queue, raw_queue, active_limit, options):
+    """
+    下载进程：各自登录一个 baostock 会话，从有界任务队列取股票，原始行交给转换进程
+    限速、退避重试和会话过期重新登录都由 BaostockClient 处理
+    """
+    client = BaostockClient(backend, rate=options["rate"], max_retries=options["max_retries"],
+                            backoff=options["retry_backoff"])
+    client.login()
+    try:
+        while True:
+            # 自适应并发：编号不小于当前并发上限的进程暂停取任务
+            while worker_id >= active_limit.value:
+                time.sleep(0.05)
+            task = task_queue.get()
+            if task is None:
+                break
+            start = time.perf_counter()
+            errors = []
+            try:
+                rows, fields = client.query_history_k_data_plus(
+                    task["code"], options["fields"], start_date=task["start_date"], end_date=task["end_date"],
+                    frequency=options["frequency"], adjustflag=options["adjustflag"])
+                errors += client.last_errors
+                factor_rows = None
+                if options["adjustflag"] == ADJUST_RAW:
+                    # 不复权存储时一并取复权因子（每只股票几十行），读取时再复权
+                    factor_rows = client.query_adjust_factor(task["code"], start_date=FACTOR_START)
+                    errors += client.last_errors
+                raw_queue.put({"status": "ok", "worker": worker_id, "task": task, "rows": rows,
+                               "fields": fields, "factor_rows": factor_rows,
+                               "latency": time.perf_counter() - start, "retries": len(errors),
+                               "errors": errors})
+            except QueryError as e:
+                errors += e.errors
+                raw_queue.put({"status": "error", "worker": worker_id, "task": task,
+                               "error": str(e), "latency": time.perf_counter() - start,
+                               "retries": len(errors) - 1, "errors": errors})
+    finally:
+        client.logout()
+
+
+def _converter(raw_queue, bars_queue):
+    """转换进程：把 baostock 返回的字符串行转成K线数组，交给主进程写盘"""
+    while True:
+        result = raw_queue.get()
+        if result is None:
+            break
+        if result["status"] == "ok":
+            start = time.perf_counter()
+            result["bars"] = bars_from_rows(result.pop("rows"), result.pop("fields"))
+            factor_rows = result.pop("factor_rows")
+            result["factors"] = factors_from_rows(*factor_rows) if factor_rows is not None else None
+            result["convert_time"] = time.perf_counter() - start
+        bars_queue.put(result)
+
+
+class ConcurrencyController:
+    """
+    简单的爬山式并发控制：每个窗口比较吞吐量，
+    吞吐上升就多开一个进程，出错率过高就减半
+    """
+
+    def __init__(self, max_workers, initial=None, window=50, max_error_rate=0.2):
+        self.max_workers = max_workers
+        self.limit = initial or max(1, max_workers // 2)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self._count = 0
+        self._errors = 0
+        self._window_start = time.perf_counter()
+        self._last_rate = 0.0
+        self._direction = 1
+
+    def observe(self, ok):
+        self._count += 1
+        self._errors += 0 if ok else 1
+        if self._count < self.window:
+            return self.limit
+        rate = self._count / max(time.perf_counter() - self._window_start, 1e-9)
+        if self._errors / self._count > self.max_error_rate:
+            self.limit = max(1, self.limit // 2)
+            self._direction = 1
+        else:
+            if rate < self._last_rate:
+                self._direction = -self._direction
+            self.limit = min(self.max_workers, max(1, self.limit + self._direction))
+        self._last_rate = rate
+        self._count = 0
+        self._errors = 0
+        self._window_start = time.perf_counter()
+        return self.limit
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(max(latencies))}
+
+
+def download_universe(stocks, start_date, end_date, fields=DEFAULT_FIELDS, workers=8, backend="baostock",
+                      frequency="d", adjustflag=ADJUST_RAW, bar_dir=BAR_DIR, max_retries=2, retry_backoff=0.5,
+                      adaptive=True, resume=True, converters=2, queue_size=None, job="download", rate=DEFAULT_RATE):
+    """
+    多进程并行下载全部股票日K线，流水线分三段同时运行：
+        下载进程（workers 个） -> 转换进程（converters 个） -> 主进程单一写盘
+    段与段之间是有界队列（queue_size，默认 workers*2），下游慢时上游自动阻塞，内存占用保持平稳
+    stocks: [{"code": "sh.600000", "code_name": "浦发银行"}, ...]
+    backend: baostock 兼容模块名，可换成本地假模块做压测
+    resume: 从上次中断处继续（同样的下载参数），已完成且文件完整的股票不再下载
+    adjustflag: 默认不复权存储并同时保存复权因子，读取时用 adjust.load_view 得到前/后复权K线
+    rate: 全部下载进程合计每秒查询次数上限（0 为不限速），各进程平分；出错时自动降速
+    重试用尽的股票进入死信列表，主流程结束后再排队重试一轮，仍失败的记入 stats["failed"]
+    返回统计信息（股票数/秒、延迟分位数等），同时写出 telemetry/<job>-*.json 指标汇总
+    """
+    options = {"fields": fields, "frequency": frequency, "adjustflag": adjustflag,
+               "max_retries": max_retries, "retry_backoff": retry_backoff, "rate": rate / workers}
+    checkpoint = IngestCheckpoint({"start_date": start_date, "end_date": end_date, "fields": fields,
+                                   "frequency": frequency, "adjustflag": adjustflag}, bar_dir)
+    if not resume:
+        checkpoint.clear()
+    tasks = [{"code": s["code"], "code_name": s["code_name"], "start_date": start_date, "end_date": end_date}
+             for s in stocks]
+    tasks = checkpoint.pending(tasks)
+    if len(tasks) < len(stocks):
+        print(f"从断点继续：跳过已完成的 {len(stocks) - len(tasks)} 只股票，剩余 {len(tasks)} 只")
+    queue_size = queue_size or workers * 2
+    task_queue = mp.Queue(maxsize=queue_size)
+    raw_queue = mp.Queue(maxsize=queue_size)
+    bars_queue = mp.Queue(maxsize=queue_size)
+    controller = ConcurrencyController(workers, initial=None if adaptive else workers)
+    active_limit = mp.Value("i", controller.limit)
+    fetchers = [mp.Process(target=_worker, args=(i, backend, task_queue, raw_queue, active_limit, options),
+                           daemon=True) for i in range(workers)]
+    convert_procs = [mp.Process(target=_converter, args=(raw_queue, bars_queue), daemon=True)
+                     for _ in range(converters)]
+    for p in fetchers + convert_procs:
+        p.start()
+
+    catalog = open_catalog(bar_dir)
+    report = QualityReport(bar_dir)
+    calendar = TradingCalendar(bar_dir)  # 只用本地日历检查缺失交易日，不联网
+    calendar = calendar if len(calendar) else None
+    telemetry = Telemetry(job)
+    dead_letters = DeadLetters()
+    latencies = []
+    per_worker = [0] * workers
+    stats = {"total": len(tasks), "skipped": len(stocks) - len(tasks), "success": 0, "empty": 0, "failed": [],
+             "retries": 0, "convert_time": 0.0, "write_time": 0.0}
+    started = time.perf_counter()
+    next_task = 0
+    done = 0
+    try:
+        while True:
+            if done == len(tasks):
+                if not dead_letters:
+                    break
+                # 主流程结束后重试死信：此时服务端通常已经恢复，仍失败的才算最终失败
+                retry = [dict(item["task"], dead_letter=True) for item in dead_letters.drain()]
+                print(f"重试 {len(retry)} 只下载失败的股票")
+                tasks.extend(retry)
+            # 有界队列：队列满时先处理结果，形成背压
+            while next_task < len(tasks):
+                try:
+                    task_queue.put_nowait(tasks[next_task])
+                    next_task += 1
+                except queue.Full:
+                    break
+            try:
+                result = bars_queue.get(timeout=0.1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in fetchers) or not any(p.is_alive() for p in convert_procs):
+                    raise RuntimeError("下载或转换进程已全部退出")
+                continue
+            done += 1
+            task = result["task"]
+            latencies.append(result["latency"])
+            per_worker[result["worker"]] += 1
+            stats["retries"] += result["retries"]
+            telemetry.observe("query_latency", result["latency"])
+            telemetry.count("symbols")
+            telemetry.count("retries", result["retries"])
+            for error in result["errors"]:
+                telemetry.count(f"error_{error.split(' ', 1)[0]}")
+            if result["status"] == "ok":
+                telemetry.add_time("convert", result["convert_time"])
+                telemetry.count("rows", len(result["bars"]))
+            if result["status"] == "ok" and len(result["bars"]):
+                # 入库前统一检查修正，下游读到的都是干净的K线
+                with telemetry.timer("validate"):
+                    result["bars"] = check_bars(task["code"], result["bars"], report, calendar)
+            if result["status"] == "ok" and len(result["bars"]):
+                write_start = time.perf_counter()
+                if result["factors"] is not None:
+                    write_factors(task["code"], result["factors"], bar_dir)
+                file_path = write_bars(task["code_name"], task["code"], result["bars"], bar_dir, catalog, adjustflag)
+                write_time = time.perf_counter() - write_start
+                stats["write_time"] += write_time
+                stats["convert_time"] += result["convert_time"]
+                telemetry.add_time("write", write_time)
+                telemetry.count("bytes_written", os.path.getsize(file_path))
+                checkpoint.mark_done(task["code"], len(result["bars"]), file_path)
+                stats["success"] += 1
+                if task.get("dead_letter"):
+                    telemetry.count("dead_letters_recovered")
+            elif result["status"] == "ok":
+                checkpoint.mark_done(task["code"])
+                stats["empty"] += 1
+            elif not task.get("dead_letter"):
+                telemetry.count("dead_letters")
+                dead_letters.add(task, result["error"])
+                print(f"{task['code']} {task['code_name']} 下载失败，稍后重试: {result['error']}")
+            else:
+                telemetry.count("failed")
+                stats["failed"].append({"code": task["code"], "error": result["error"]})
+                print(f"{task['code']} {task['code_name']} 下载失败: {result['error']}")
+            if checkpoint.due():
+                # 先保存目录再保存断点，断点记录的股票一定已在目录中
+                catalog.save()
+                report.save()
+                checkpoint.save()
+            if adaptive:
+                active_limit.value = controller.observe(result["status"] == "ok")
+            if done % 100 == 0 or done == len(tasks):
+                elapsed = time.perf_counter() - started
+                print(f"已完成 {done} / {len(tasks)}，{done / elapsed:.1f} 只/秒，当前并发 {active_limit.value}")
+    finally:
+        catalog.save()
+        report.save()
+        checkpoint.save()
+        if done < len(tasks):
+            # 异常退出：队列里可能还有未消费的数据，直接结束子进程
+            for p in fetchers + convert_procs:
+                p.terminate()
+        else:
+            active_limit.value = workers  # 让暂停中的进程也能取到结束标记
+            for _ in fetchers:
+                task_queue.put(None)
+            for p in fetchers:
+                p.join(timeout=10)
+            for _ in convert_procs:
+                raw_queue.put(None)
+            for p in convert_procs:
+                p.join(timeout=10)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed"] = elapsed
+    stats["symbols_per_sec"] = stats["total"] / elapsed if elapsed > 0 else 0.0
+    stats["latency"] = latency_summary(latencies)
+    stats["per_worker"] = per_worker
+    stats["final_concurrency"] = controller.limit
+    telemetry.count("query_attempts", len(latencies) + stats["retries"])
+    stats["telemetry"] = telemetry.write()
+    return stats
+
+
+def print_stats(stats):
+    lat = stats["latency"]
+    print(f"处理完成！成功 {stats['success']}，无数据 {stats['empty']}，失败 {len(stats['failed'])}，"
+          f"重试 {stats['retries']} 次")
+    print(f"耗时 {stats['elapsed']:.1f} 秒，{stats['symbols_per_sec']:.2f} 只/秒"
+          f"（转换 {stats['convert_time']:.1f} 秒，写盘 {stats['write_time']:.1f} 秒，与下载重叠进行）")
+    print(f"单次查询延迟 p50={lat['p50']*1000:.0f}ms p95={lat['p95']*1000:.0f}ms "
+          f"p99={lat['p99']*1000:.0f}ms max={lat['max']*1000:.0f}ms")
+    if "telemetry" in stats:
+        print(f"指标汇总已写入 {TELEMETRY_DIR}/{stats['telemetry']['job']}-latest.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程并行下载全市场日K线")
+    parser.add_argument("--stocks", default="all_pure_stock.json", help="股票列表JSON")
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--end", default="2025-08-18")
+    parser.add_argument("--fields", default=DEFAULT_FIELDS)
+    parser.add_argument("--workers", type=int, default=8, help="下载进程数")
+    parser.add_argument("--converters", type=int, default=2, help="转换进程数")
+    parser.add_argument("--backend", default="baostock", help="baostock 兼容模块名")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="合计每秒查询次数上限，0 为不限速")
+    parser.add_argument("--fixed", action="store_true", help="关闭自适应并发，固定使用全部进程")
+    parser.add_argument("--restart", action="store_true", help="忽略断点，全部重新下载")
+    args = parser.parse_args(argv)
+
+    with open(args.stocks, "r", encoding="utf-8") as f:
+        stocks = json.load(f)
+    print("总共需要处理", len(stocks), "只股票")
+    stats = download_universe(stocks, args.start, args.end, fields=args.fields, workers=args.workers,
+                              backend=args.backend, adaptive=not args.fixed, resume=not args.restart,
+                              converters=args.converters, rate=args.rate)
+    print_stats(stats)
+    return stats
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,306 @@
+# 离线的 baostock 替身：回放录制好的查询结果，可配置延迟、出错率和限速，用于压测和复现问题
+#
+# 录制（需要真实 baostock）：
+#     python fakebaostock.py record --stocks all_pure_stock.json --start 2023-01-01 --end 2025-08-18 --limit 200
+# 回放（脚本无需修改，fakebs/ 目录里的 baostock.py 会顶替真实模块）：
+#     PYTHONPATH=fakebs python main.py
+#
+# 环境变量：
+#     FAKEBS_FIXTURES     录制文件目录，默认 fixtures
+#     FAKEBS_LATENCY_MS   每次查询的平均延迟（毫秒），默认 0
+#     FAKEBS_JITTER_MS    延迟的随机抖动（毫秒），默认 0
+#     FAKEBS_ERROR_RATE   查询返回网络错误的概率，默认 0
+#     FAKEBS_MAX_QPS      每个会话每秒最多处理的查询数，0 为不限
+#     FAKEBS_SESSION_CALLS 会话查询多少次后过期（需重新登录），0 为不过期
+#     FAKEBS_SYNTH        没有录制文件的股票是否生成确定性的模拟行情和复权因子，默认 1
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import random
+import argparse
+from datetime import date, datetime, timedelta
+import numpy as np
+
+FIXTURE_DIR = os.environ.get("FAKEBS_FIXTURES", "fixtures")
+LATENCY_MS = float(os.environ.get("FAKEBS_LATENCY_MS", "0"))
+JITTER_MS = float(os.environ.get("FAKEBS_JITTER_MS", "0"))
+ERROR_RATE = float(os.environ.get("FAKEBS_ERROR_RATE", "0"))
+MAX_QPS = float(os.environ.get("FAKEBS_MAX_QPS", "0"))
+SESSION_CALLS = int(os.environ.get("FAKEBS_SESSION_CALLS", "0"))
+SYNTH = os.environ.get("FAKEBS_SYNTH", "1") == "1"
+
+# baostock 的错误码
+NOT_LOGGED_IN = ("10001001", "用户未登录")
+NETWORK_ERROR = ("10002007", "网络接收错误。")
+
+
+class ResultData:
+    """与 baostock ResultData 接口一致的结果集"""
+
+    def __init__(self, fields=None, rows=None, error_code="0", error_msg="success"):
+        self.fields = fields or []
+        self.data = rows or []
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self._cursor = -1
+
+    def next(self):
+        self._cursor += 1
+        return self._cursor < len(self.data)
+
+    def get_row_data(self):
+        return self.data[self._cursor]
+
+    def get_data(self):
+        import pandas as pd
+        return pd.DataFrame(self.data, columns=self.fields)
+
+
+class _Session:
+    logged_in = False
+    calls = 0
+    next_slot = 0.0
+
+
+_session = _Session()
+
+
+def login(user_id="anonymous", password="123456", options=0):
+    _session.logged_in = True
+    _session.calls = 0
+    return ResultData()
+
+
+def logout(user_id="anonymous"):
+    _session.logged_in = False
+    return ResultData()
+
+
+def _serve():
+    """模拟一次网络往返：会话检查、限速、延迟、随机错误；返回错误结果或 None"""
+    if not _session.logged_in or (SESSION_CALLS and _session.calls >= SESSION_CALLS):
+        _session.logged_in = False
+        return ResultData(error_code=NOT_LOGGED_IN[0], error_msg=NOT_LOGGED_IN[1])
+    _session.calls += 1
+    if MAX_QPS > 0:
+        now = time.monotonic()
+        wait = _session.next_slot - now
+        if wait > 0:
+            time.sleep(wait)
+        _session.next_slot = max(now, _session.next_slot) + 1.0 / MAX_QPS
+    delay = LATENCY_MS + (random.uniform(-JITTER_MS, JITTER_MS) if JITTER_MS else 0)
+    if delay > 0:
+        time.sleep(delay / 1000.0)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return ResultData(error_code=NETWORK_ERROR[0], error_msg=NETWORK_ERROR[1])
+    return None
+
+
+def _fixture_path(*parts):
+    return os.path.join(FIXTURE_DIR, *parts) + ".json.gz"
+
+
+def _load_fixture(path):
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_fixture(path, fields, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"fields": fields, "rows": rows}, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _intraday_times(frequency):
+    step = int(frequency)
+    morning = [9 * 60 + 30 + m for m in range(step, 121, step)]
+    afternoon = [13 * 60 + m for m in range(step, 121, step)]
+    return [f"{t // 60:02d}{t % 60:02d}00000" for t in morning + afternoon]
+
+
+def _synth_k_data(code, start_date, end_date, frequency, adjustflag):
+    """按代码生成确定性的随机游走行情（同一股票任意区间查询结果互相一致）"""
+    start = np.datetime64(start_date or "2015-01-01", "D")
+    end = np.datetime64(end_date or date.today().isoformat(), "D")
+    origin = np.datetime64("2015-01-01", "D")
+    days = np.arange(origin, end + 1)
+    days = days[np.is_busday(days)]
+    if not len(days):
+        return []
+    rng = np.random.default_rng(zlib.crc32(code.encode("utf-8")))
+    close = 10.0 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+    open_ = close * (1 + rng.normal(0, 0.005, len(days)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, len(days))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, len(days))))
+    volume = rng.integers(1_000_000, 50_000_000, len(days))
+    keep = days >= start
+    columns = {"date": days[keep].astype(str), "open": open_[keep], "high": high[keep], "low": low[keep],
+               "close": close[keep], "volume": volume[keep]}
+    columns["amount"] = columns["volume"] * columns["close"]
+    rows = []
+    if frequency in ("5", "15", "30", "60"):
+        # 日内从开盘价走到收盘价，逐根加小幅扰动
+        times = _intraday_times(frequency)
+        steps = np.linspace(0, 1, len(times) + 1)
+        for i, d in enumerate(columns["date"]):
+            path = columns["open"][i] + (columns["close"][i] - columns["open"][i]) * steps
+            path[1:-1] *= 1 + rng.normal(0, 0.002, len(times) - 1)
+            per = columns["volume"][i] // len(times)
+            for j, t in enumerate(times):
+                o, c = path[j], path[j + 1]
+                rows.append({"date": d, "time": d.replace("-", "") + t, "open": o, "high": max(o, c) * 1.001,
+                             "low": min(o, c) * 0.999, "close": c, "volume": per, "amount": per * c})
+    else:
+        for i, d in enumerate(columns["date"]):
+            rows.append({name: columns[name][i] for name in columns})
+    return rows
+
+
+def _format(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.10f}"
+    return str(value)
+
+
+def query_history_k_data_plus(code, fields, start_date=None, end_date=None, frequency="d", adjustflag="3"):
+    error = _serve()
+    if error is not None:
+        return error
+    fields = [name.strip() for name in fields.split(",")]
+    fixture = _load_fixture(_fixture_path("k", f"{code}_{frequency}_{adjustflag}"))
+    if fixture is not None:
+        index = [fixture["fields"].index(name) if name in fixture["fields"] else None for name in fields]
+        date_col = fixture["fields"].index("date")
+        rows = [[row[i] if i is not None else "" for i in index] for row in fixture["rows"]
+                if (not start_date or row[date_col] >= start_date) and (not end_date or row[date_col] <= end_date)]
+        return ResultData(fields, rows)
+    if not SYNTH:
+        return ResultData(fields, [])
+    records = _synth_k_data(code, start_date, end_date, frequency, adjustflag)
+    rows = [[_format(rec.get(name, code if name == "code" else "")) for name in fields] for rec in records]
+    return ResultData(fields, rows)
+
+
+def query_all_stock(day=None):
+    error = _serve()
+    if error is not None:
+        return error
+    fixture = _load_fixture(_fixture_path("all_stock", day or "latest"))
+    if fixture is None:
+        fixture = _load_fixture(_fixture_path("all_stock", "latest"))
+    if fixture is None and os.path.exists("all_stock.json"):
+        # 没有录制该日期时退回仓库里的 all_stock.json
+        with open("all_stock.json", "r", encoding="utf-8") as f:
+            records = json.load(f)
+        fields = ["code", "tradeStatus", "code_name"]
+        fixture = {"fields": fields, "rows": [[rec[name] for name in fields] for rec in records]}
+    if fixture is None:
+        return ResultData(["code", "tradeStatus", "code_name"], [])
+    return ResultData(fixture["fields"], fixture["rows"])
+
+
+def query_trade_dates(start_date=None, end_date=None):
+    error = _serve()
+    if error is not None:
+        return error
+    fixture = _load_fixture(_fixture_path("trade_dates", "all"))
+    start = start_date or "2015-01-01"
+    end = end_date or date.today().isoformat()
+    if fixture is not None:
+        rows = [row for row in fixture["rows"] if start <= row[0] <= end]
+        return ResultData(fixture["fields"], rows)
+    # 没有录制时按工作日近似
+    d = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    rows = []
+    while d <= last:
+        rows.append([d.isoformat(), "1" if d.weekday() < 5 else "0"])
+        d += timedelta(days=1)
+    return ResultData(["calendar_date", "is_trading_day"], rows)
+
+
+def _synth_adjust_factor(code):
+    """每年7月第一个工作日除权一次，后复权因子累乘（模拟行情本身不体现除权缺口）"""
+    rng = np.random.default_rng(zlib.crc32(("factor:" + code).encode("utf-8")))
+    dates = [np.busday_offset(f"{year}-07-01", 0, roll="forward") for year in range(2016, date.today().year + 1)]
+    dates = [d for d in dates if d <= np.datetime64(date.today().isoformat())]
+    back = np.cumprod(1 + rng.uniform(0.01, 0.05, len(dates)))
+    return [[code, str(d), _format(b / back[-1]), _format(b), _format(b)] for d, b in zip(dates, back)]
+
+
+def query_adjust_factor(code, start_date=None, end_date=None):
+    error = _serve()
+    if error is not None:
+        return error
+    fields = ["code", "dividOperateDate", "foreAdjustFactor", "backAdjustFactor", "adjustFactor"]
+    fixture = _load_fixture(_fixture_path("adjust_factor", code))
+    if fixture is None and SYNTH:
+        fixture = {"fields": fields, "rows": _synth_adjust_factor(code)}
+    if fixture is None:
+        return ResultData(fields, [])
+    rows = [row for row in fixture["rows"]
+            if (not start_date or row[1] >= start_date) and (not end_date or row[1] <= end_date)]
+    return ResultData(fixture["fields"], rows)
+
+
+def _drain(rs):
+    rows = []
+    while (rs.error_code == "0") & rs.next():
+        rows.append(rs.get_row_data())
+    if rs.error_code != "0":
+        raise RuntimeError(f"{rs.error_code} {rs.error_msg}")
+    return rs.fields, rows
+
+
+def record(stocks, start_date, end_date, frequencies=("d",), adjustflags=("2", "3"), fields=None):
+    """用真实 baostock 录制回放所需的数据"""
+    import baostock as real_bs
+    real_bs.login()
+    try:
+        all_stock = _drain(real_bs.query_all_stock())
+        _save_fixture(_fixture_path("all_stock", "latest"), *all_stock)
+        _save_fixture(_fixture_path("all_stock", date.today().isoformat()), *all_stock)
+        _save_fixture(_fixture_path("trade_dates", "all"),
+                      *_drain(real_bs.query_trade_dates(start_date="2015-01-01", end_date=end_date)))
+        for i, stock in enumerate(stocks, 1):
+            code = stock["code"]
+            print(f"录制第 {i} / {len(stocks)} 只股票: {code}")
+            for frequency in frequencies:
+                if frequency in ("5", "15", "30", "60"):
+                    k_fields = fields or "date,time,code,open,high,low,close,volume,amount,adjustflag"
+                else:
+                    k_fields = fields or "date,code,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,isST"
+                for adjustflag in adjustflags:
+                    rs = real_bs.query_history_k_data_plus(code, k_fields, start_date=start_date, end_date=end_date,
+                                                          frequency=frequency, adjustflag=adjustflag)
+                    _save_fixture(_fixture_path("k", f"{code}_{frequency}_{adjustflag}"), *_drain(rs))
+            _save_fixture(_fixture_path("adjust_factor", code),
+                          *_drain(real_bs.query_adjust_factor(code=code, start_date="1990-01-01", end_date=end_date)))
+    finally:
+        real_bs.logout()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录制 baostock 查询结果供离线回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record")
+    rec.add_argument("--stocks", default="all_pure_stock.json")
+    rec.add_argument("--start", default="2023-01-01")
+    rec.add_argument("--end", default=date.today().isoformat())
+    rec.add_argument("--limit", type=int, default=0, help="只录制前N只股票")
+    rec.add_argument("--frequencies", default="d", help="逗号分隔，如 d,5")
+    args = parser.parse_args(argv)
+    with open(args.stocks, "r", encoding="utf-8") as f:
+        stocks = json.load(f)
+    if args.limit:
+        stocks = stocks[:args.limit]
+    record(stocks, args.start, args.end, frequencies=args.frequencies.split(","))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
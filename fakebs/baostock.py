@@ -0,0 +1,8 @@
+# 把本目录放到 PYTHONPATH 最前面即可让现有脚本使用离线替身：
+#     PYTHONPATH=fakebs python main.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fakebaostock import *  # noqa: E402,F401,F403
+from fakebaostock import ResultData  # noqa: E402,F401
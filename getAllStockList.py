@@ -1,30 +1,18 @@
+import sys
+import json
+from universe import apply_renames, snapshot_to_records, update_universe
 
-import baostock as bs
-import pandas as pd
+# 用法：python getAllStockList.py [日期]，日期为空默认为当天（非交易日自动取之前最近的交易日）
+# 快照按日期存入 universe/index.npz，并与上一份快照比较：
+#   改名（含戴帽/摘帽）直接改K线文件名，不重新下载；
+#   新上市、退市、停复牌等有变化的证券写入 universe/changes-<日期>.json，下载脚本只需处理这些证券
+if __name__ == "__main__":
+    day, snapshot, diff = update_universe(sys.argv[1] if len(sys.argv) > 1 else None)
 
-#### 登陆系统 ####
-lg = bs.login()
-# 显示登陆返回信息
-print('login respond error_code:'+lg.error_code)
-print('login respond  error_msg:'+lg.error_msg)
+    if diff is not None and diff["renamed"]:
+        print(f"已更新 {apply_renames(diff['renamed'])} 只改名证券的K线文件名")
 
-#### 获取证券信息 ####
-rs = bs.query_all_stock(day="2025-06-20")            #day  表示查询的日期，为空默认为当前日期
-print('query_all_stock respond error_code:'+rs.error_code)
-print('query_all_stock respond  error_msg:'+rs.error_msg)
-
-#### 打印结果集 ####
-data_list = []
-while (rs.error_code == '0') & rs.next():
-    # 获取一条记录，将记录合并在一起
-    data_list.append(rs.get_row_data())
-result = pd.DataFrame(data_list, columns=rs.fields)
-
-#### 结果集输出到csv文件 ####   
-# result.to_csv("D:\\all_stock.csv", encoding="gbk", index=False)
-result.to_json("all_stock.json", orient='records', force_ascii=False, indent=2)
-
-print(result)
-
-#### 登出系统 ####
-bs.logout()
\ No newline at end of file
+    # 保留 all_stock.json，兼容原有脚本
+    with open("all_stock.json", "w", encoding="utf-8") as f:
+        json.dump(snapshot_to_records(snapshot), f, ensure_ascii=False, indent=2)
+    print(f"已生成 all_stock.json，共 {len(snapshot)} 只证券（{day}）")
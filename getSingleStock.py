@@ -1,13 +1,13 @@
-import baostock as bs
-import pandas as pd
-import json
-import os
+import bscache as bs  # 带本地缓存的 baostock，重复查询直接读缓存
+from adjust import factors_from_rows, query_factor_rows, write_factors
+from barstore import ADJUST_RAW, BAR_DIR, bars_from_rows, write_bars
+from catalog import open_catalog
 
 # 配置参数
 stock = {
     "start_date": "2024-01-01",
     "end_date": "2024-06-30",
-    "output_dir": "data",
+    "output_dir": BAR_DIR,
     "stock_code": "sz.002230",  # 你可以修改为任意股票代码
     "stock_name": "科大讯飞"      # 你可以修改为任意股票名称
 }
@@ -24,17 +24,20 @@ try:
         start_date=stock["start_date"],
         end_date=stock["end_date"],
         frequency="d",
-        adjustflag="2"  # 前复权
+        adjustflag="3"  # 不复权
     )
     stock_list = []
     while (rs.error_code == '0') & rs.next():
         stock_list.append(rs.get_row_data())
     if stock_list:
-        df = pd.DataFrame(stock_list, columns=rs.fields)
-        os.makedirs(stock["output_dir"], exist_ok=True)
-        file_name = f"{stock['stock_name']}-{stock['stock_code'].split('.')[-1]}.json"
-        file_path = os.path.join(stock["output_dir"], file_name)
-        df.to_json(file_path, orient='records', force_ascii=False, indent=2)
+        bars = bars_from_rows(stock_list, rs.fields)
+        # 同时保存复权因子，读取时用 adjust.load_adjusted 得到前复权K线
+        factors = factors_from_rows(*query_factor_rows(bs, stock["stock_code"]))
+        write_factors(stock["stock_code"], factors, stock["output_dir"])
+        catalog = open_catalog(stock["output_dir"])
+        file_path = write_bars(stock["stock_name"], stock["stock_code"], bars, stock["output_dir"], catalog,
+                               ADJUST_RAW)
+        catalog.save()
         print(f"已保存数据到: {file_path}")
     else:
         print("未获取到数据")
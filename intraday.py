@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import argparse
+import time
+import multiprocessing as mp
+from datetime import date, timedelta
+import numpy as np
+from bsclient import BaostockClient, QueryError
+from telemetry import Telemetry
+
+INTRADAY_DIR = "intraday"
+INTRADAY_FIELDS = "date,time,open,high,low,close,volume,amount"
+
+# 分钟线按股票存一个文件，紧凑定长记录：时间精确到分钟，价格 float32（A股价格有效位数足够），
+# 成交量/成交额 float64；一只股票一年5分钟线约 12000 行 × 40 字节 ≈ 0.5MB
+INTRADAY_DTYPE = np.dtype([
+    ("ts", "datetime64[m]"),
+    ("open", "<f4"), ("high", "<f4"), ("low", "<f4"), ("close", "<f4"),
+    ("volume", "<f8"), ("amount", "<f8"),
+])
+
+
+def parse_time_strings(times):
+    """
+    向量化解析 baostock 的时间字符串 "20240102093500000" -> datetime64[m]
+    只取前12位 YYYYMMDDHHMM 转整数，再用整数运算拆出年月日时分
+    """
+    v = np.asarray(times, dtype="U12").astype(np.int64)
+    minute = v % 100
+    hour = v // 100 % 100
+    day = v // 10 ** 4 % 100
+    month = v // 10 ** 6 % 100
+    year = v // 10 ** 8
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    return days.astype("datetime64[m]") + (hour * 60 + minute).astype("timedelta64[m]")
+
+
+def intraday_from_rows(rows, fields):
+    """baostock 分钟线结果集转定长数组（一次向量化处理，不逐行调用 Python 函数）"""
+    if not rows:
+        return np.empty(0, dtype=INTRADAY_DTYPE)
+    columns = dict(zip(fields, zip(*rows)))
+    bars = np.empty(len(rows), dtype=INTRADAY_DTYPE)
+    bars["ts"] = parse_time_strings(columns["time"])
+    for name in INTRADAY_DTYPE.names[1:]:
+        col = np.asarray(columns[name], dtype=object) if name in columns else np.full(len(rows), "nan", dtype=object)
+        col[col == ''] = 'nan'
+        bars[name] = col.astype(str).astype("<f8")
+    return bars[np.argsort(bars["ts"], kind="stable")]
+
+
+def intraday_to_frame(bars):
+    """分钟线数组转 DataFrame，timestamps 列格式为 2024-01-02 09:35:00"""
+    import pandas as pd
+    df = pd.DataFrame({name: bars[name] for name in INTRADAY_DTYPE.names[1:]})
+    df.insert(0, "timestamps", pd.to_datetime(bars["ts"]).strftime("%Y-%m-%d %H:%M:%S"))
+    return df
+
+
+def intraday_path(stock_code, intraday_dir=INTRADAY_DIR, frequency="5"):
+    return os.path.join(intraday_dir, frequency, f"{stock_code}.npy")
+
+
+def load_intraday(stock_code, intraday_dir=INTRADAY_DIR, frequency="5"):
+    path = intraday_path(stock_code, intraday_dir, frequency)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=INTRADAY_DTYPE)
+    return np.load(path)
+
+
+def write_intraday(stock_code, bars, intraday_dir=INTRADAY_DIR, frequency="5"):
+    """与已存数据按时间合并去重后原子写入"""
+    path = intraday_path(stock_code, intraday_dir, frequency)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    old = load_intraday(stock_code, intraday_dir, frequency)
+    if len(old):
+        merged = np.concatenate([old, bars])
+        _, first = np.unique(merged["ts"][::-1], return_index=True)
+        bars = merged[::-1][first]  # 同一时间保留新数据，np.unique 已按时间排序
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(bars, dtype=INTRADAY_DTYPE))
+    os.replace(tmp_path, path)
+    return path
+
+
+def month_chunks(start_date, end_date):
+    """把 [start_date, end_date] 切成按自然月的区间"""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    chunks = []
+    while start <= end:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, next_month - timedelta(days=1))
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = next_month
+    return chunks
+
+
+_client = None
+
+
+def _login(backend, rate):
+    global _client
+    _client = BaostockClient(backend, rate=rate, max_retries=2)
+    _client.login()
+
+
+def _fetch_chunk(task):
+    """返回 (代码, 分钟线, 错误, 指标)，指标含查询耗时、转换耗时和失败的错误码"""
+    code, start_date, end_date, frequency, adjustflag = task
+    metrics = {"latency": 0.0, "convert": 0.0, "errors": []}
+    start = time.perf_counter()
+    try:
+        rows, fields = _client.query_history_k_data_plus(code, INTRADAY_FIELDS, start_date=start_date,
+                                                         end_date=end_date, frequency=frequency,
+                                                         adjustflag=adjustflag)
+    except QueryError as e:
+        metrics["latency"] = time.perf_counter() - start
+        metrics["errors"] = e.errors
+        return code, None, f"{start_date}~{end_date} {e}", metrics
+    metrics["latency"] = time.perf_counter() - start
+    metrics["errors"] = _client.last_errors
+    start = time.perf_counter()
+    bars = intraday_from_rows(rows, fields)
+    metrics["convert"] = time.perf_counter() - start
+    return code, bars, None, metrics
+
+
+def fetch_intraday(codes, start_date, end_date, frequency="5", adjustflag="3", workers=8, backend="bscache",
+                   intraday_dir=INTRADAY_DIR, write=True, keep_results=True, job="intraday", rate=20.0):
+    """
+    按月切块并行下载分钟线：每个进程一个 baostock 会话，
+    同一股票各月数据下载完后合并写入一个文件；
+    返回 (结果, 失败)：结果为 {代码: 分钟线数组}（全市场下载时传 keep_results=False，只返回 {代码: 行数}），
+    失败为 {代码: [失败月份的错误]}；有月份下载失败的股票不写盘也不放进结果，避免库里留下整月的缺口
+    rate 为全部进程合计每秒查询次数上限（0 为不限速）
+    指标汇总写入 telemetry/<job>-*.json
+    """
+    chunks = month_chunks(start_date, end_date)
+    tasks = [(code, s, e, frequency, adjustflag) for code in codes for s, e in chunks]
+    parts = {code: [] for code in codes}
+    remaining = {code: len(chunks) for code in codes}
+    results = {}
+    failed = {}
+    telemetry = Telemetry(job)
+    with mp.Pool(workers, initializer=_login, initargs=(backend, rate / workers)) as pool:
+        for code, bars, error, metrics in pool.imap_unordered(_fetch_chunk, tasks):
+            telemetry.count("chunks")
+            telemetry.observe("query_latency", metrics["latency"])
+            telemetry.add_time("convert", metrics["convert"])
+            telemetry.count("retries", len(metrics["errors"]) - (1 if error else 0))
+            for error_code in metrics["errors"]:
+                telemetry.count(f"error_{error_code}")
+            if error:
+                print(f"{code} 下载失败: {error}")
+                failed.setdefault(code, []).append(error)
+            elif len(bars):
+                parts[code].append(bars)
+            remaining[code] -= 1
+            if remaining[code] == 0 and code in failed:
+                parts.pop(code)
+                telemetry.count("failed_symbols")
+                print(f"{code} 有 {len(failed[code])} 个月下载失败，未写入")
+            elif remaining[code] == 0:
+                # 这只股票的所有月份都已返回，合并后立即写盘释放内存
+                bars = np.concatenate(parts.pop(code)) if parts[code] else np.empty(0, dtype=INTRADAY_DTYPE)
+                bars = bars[np.argsort(bars["ts"], kind="stable")]
+                telemetry.count("rows", len(bars))
+                if write and len(bars):
+                    with telemetry.timer("write"):
+                        path = write_intraday(code, bars, intraday_dir, frequency)
+                    telemetry.count("bytes_written", os.path.getsize(path))
+                results[code] = bars if keep_results else len(bars)
+                print(f"{code} 完成，共 {len(bars)} 根K线")
+    telemetry.write()
+    return results, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按月并行下载全市场分钟线")
+    parser.add_argument("--stocks", default="all_pure_stock.json")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", default=date.today().isoformat())
+    parser.add_argument("--frequency", default="5")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--backend", default="bscache")
+    args = parser.parse_args(argv)
+    with open(args.stocks, "r", encoding="utf-8") as f:
+        codes = [stock["code"] for stock in json.load(f)]
+    _, failed = fetch_intraday(codes, args.start, args.end, frequency=args.frequency, workers=args.workers,
+                               backend=args.backend, write=True, keep_results=False)
+    if failed:
+        print(f"{len(failed)} 只股票有月份下载失败，未写入: {', '.join(sorted(failed))}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
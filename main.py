@@ -1,59 +1,26 @@
-import baostock as bs
-import pandas as pd
 import json
-import os
-from time import sleep
+from downloader import download_universe, print_stats
 
-# 登录系统
-lg = bs.login()
-print("登录状态:", lg.error_code)
+WORKERS = 8  # 并行下载进程数，每个进程一个 baostock 会话
 
-try:
-    with open("all_pure_stock.json", "r", encoding="utf-8") as f:
-        stocks = json.load(f)
-    
-    print("总共需要处理", len(stocks), "只股票")
-    os.makedirs("data", exist_ok=True)
-    
-    success_count = 0
-    for i, stock in enumerate(stocks, 1):
-        print("处理第", i, "/", len(stocks), "只股票:", stock["code_name"])
+if __name__ == "__main__":
+    try:
+        with open("all_pure_stock.json", "r", encoding="utf-8") as f:
+            stocks = json.load(f)
         
-        try:
-            rs = bs.query_history_k_data_plus(
-                stock["code"],
-                "date,open,high,low,close,amount",
-                start_date="2023-01-01",
-                end_date="2025-08-18",
-                frequency="d",
-                adjustflag="2"
-            )
-            
-            stock_list = []
-            while (rs.error_code == "0") & rs.next():
-                stock_list.append(rs.get_row_data())
-            
-            if stock_list:
-                df = pd.DataFrame(stock_list, columns=rs.fields)
-                file_name = stock["code_name"] + "-" + stock["code"].split(".")[-1] + ".json"
-                file_path = os.path.join("data", file_name)
-                df.to_json(file_path, orient="records", force_ascii=False, indent=2)
-                print("已保存数据到:", file_path)
-                success_count += 1
-            else:
-                print("警告: 没有获取到数据")
-            
-            # sleep(0.5)
-            
-        except Exception as e:
-            print("处理股票时出错:", str(e))
-            continue
+        print("总共需要处理", len(stocks), "只股票")
+        stats = download_universe(
+            stocks,
+            start_date="2023-01-01",
+            end_date="2025-08-18",
+            fields="date,open,high,low,close,amount",
+            workers=WORKERS,
+            frequency="d",
+            adjustflag="3",  # 不复权存储，另存复权因子，读取时再复权
+            backend="bscache",  # 重复的历史区间查询直接读本地缓存
+            job="main"          # 指标写入 telemetry/main-*.json
+        )
+        print_stats(stats)
     
-    print("处理完成！成功获取", success_count, "只股票的数据")
-
-except Exception as e:
-    print("发生错误:", str(e))
-
-finally:
-    bs.logout()
-    print("已登出系统")
+    except Exception as e:
+        print("发生错误:", str(e))
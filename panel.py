@@ -0,0 +1,170 @@
+import os
+import json
+import numpy as np
+from adjust import load_view
+from barstore import BAR_DIR, BAR_DTYPE, BAR_FIELDS, parse_file_name
+from catalog import full_code, open_catalog
+
+PANEL_DIR = "panel"
+PANEL_FILE = "panel.npy"
+META_FILE = "meta.json"
+
+# 全市场面板布局为 (字段, 日期, 股票)：
+# 同一字段的 日期×股票 平面是连续内存，取最近N天某字段只是一个切片视图
+# 停牌或尚未上市的日期为 NaN
+
+
+def build_panel(bar_dir=BAR_DIR, panel_dir=PANEL_DIR, calendar=None):
+    """把股票池内全部股票对齐到交易日历，写成内存映射面板（价格为前复权）"""
+    from universe_filter import tradable_files
+
+    bar_files = tradable_files(bar_dir)
+    catalog = open_catalog(bar_dir)
+    all_bars = []
+    symbols = []
+    for file_path in bar_files:
+        bars = load_view(file_path, bar_dir=bar_dir, catalog=catalog)
+        if not len(bars):
+            continue
+        stock_name, stock_code = parse_file_name(file_path)
+        # code 为6位代码（输出用），full_code 为带交易所前缀的代码（sh.000001 与 sz.000001 不冲突）
+        entry = catalog.entry_for_file(file_path)
+        symbols.append({"name": stock_name, "code": stock_code,
+                        "full_code": entry["code"] if entry else full_code(stock_code),
+                        "file": os.path.basename(file_path)})
+        all_bars.append(bars)
+    if calendar is None:
+        # 没有给定交易日历时，用本地缓存的交易日历（不联网）；日历没覆盖到时退回所有股票出现过的日期并集
+        from trading_calendar import TradingCalendar
+
+        calendar = np.unique(np.concatenate([bars["date"] for bars in all_bars])) if all_bars else np.empty(0, "datetime64[D]")
+        trading = TradingCalendar(bar_dir)
+        if len(trading) and len(calendar) and trading.covered_end >= calendar[-1]:
+            calendar = trading.between(calendar[0], calendar[-1])
+    calendar = np.asarray(calendar, dtype="datetime64[D]")
+
+    os.makedirs(panel_dir, exist_ok=True)
+    panel_path = os.path.join(panel_dir, PANEL_FILE)
+    tmp_path = panel_path + ".tmp"
+    shape = (len(BAR_FIELDS), len(calendar), len(symbols))
+    data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype="<f8", shape=shape)
+    data[:] = np.nan
+    for j, bars in enumerate(all_bars):
+        idx = np.searchsorted(calendar, bars["date"])
+        ok = (idx < len(calendar))
+        ok[ok] = calendar[idx[ok]] == bars["date"][ok]
+        for i, name in enumerate(BAR_FIELDS):
+            data[i, idx[ok], j] = bars[name][ok]
+        # 面板中这只股票的有效行数，按回看窗口读取时用来判断窗口是否已经包含全部历史
+        symbols[j]["rows"] = int(ok.sum())
+    data.flush()
+    del data
+
+    # 元数据先原子替换，再替换数组：中途崩溃或读取方恰好夹在两次替换之间时，
+    # 数组形状与元数据对不上，MarketPanel 直接报错而不会把列对到错误的股票上
+    meta = {
+        "fields": list(BAR_FIELDS),
+        "dates": [str(d) for d in calendar],
+        "symbols": symbols,
+    }
+    meta_path = os.path.join(panel_dir, META_FILE)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+    os.replace(tmp_path, panel_path)
+    print(f"面板已生成: {panel_path}，{len(calendar)} 个交易日 × {len(symbols)} 只股票")
+    return panel_path
+
+
+class MarketPanel:
+    """
+    只读的全市场面板，底层是 np.load(mmap_mode='r')：
+    打开几乎没有开销，多个进程扫描同一面板时共享操作系统页缓存
+    """
+
+    def __init__(self, panel_dir=PANEL_DIR):
+        with open(os.path.join(panel_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.panel_dir = panel_dir
+        self.fields = meta["fields"]
+        self.dates = np.array(meta["dates"], dtype="datetime64[D]")
+        self.symbols = meta["symbols"]
+        self.data = np.load(os.path.join(panel_dir, PANEL_FILE), mmap_mode="r")
+        expected = (len(self.fields), len(self.dates), len(self.symbols))
+        if self.data.shape != expected:
+            raise ValueError(f"面板数组形状 {self.data.shape} 与元数据 {expected} 不一致，"
+                             f"可能正在重建或上次构建中断，请重新运行 python panel.py")
+        self._field_index = {name: i for i, name in enumerate(self.fields)}
+        # 旧面板没有 full_code，按代码首位推断交易所
+        self._symbol_index = {s.get("full_code") or full_code(s["code"]): j for j, s in enumerate(self.symbols)}
+        self._by_number = {}
+        for code in self._symbol_index:
+            self._by_number.setdefault(code.split('.')[-1], []).append(code)
+
+    def field(self, name):
+        """某字段的 日期×股票 视图（零拷贝）"""
+        return self.data[self._field_index[name]]
+
+    def window(self, name, last_n):
+        """某字段最近 last_n 个交易日的 日期×股票 视图（零拷贝）"""
+        return self.data[self._field_index[name], -last_n:, :]
+
+    def date_slice(self, start_date, end_date):
+        """日期区间 [start_date, end_date] 对应的行切片"""
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, "D"), side="left")
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right")
+        return slice(lo, hi)
+
+    def symbol_index(self, stock_code):
+        """股票代码对应的列号；不带 sh./sz. 前缀的代码对应多个证券时报错（与 SymbolCatalog.lookup 一致）"""
+        if '.' in stock_code:
+            return self._symbol_index[stock_code]
+        codes = self._by_number.get(stock_code, [])
+        if len(codes) > 1:
+            raise ValueError(f"股票代码 {stock_code} 对应多个证券: {codes}，请带上交易所前缀")
+        if not codes:
+            raise KeyError(stock_code)
+        return self._symbol_index[codes[0]]
+
+    def series(self, name, stock_code):
+        """单只股票某字段的时间序列视图（零拷贝，停牌日为 NaN）"""
+        return self.field(name)[:, self.symbol_index(stock_code)]
+
+    def symbol_bars(self, lo, hi, lookback=None):
+        """
+        列 [lo, hi) 的股票各自还原成K线数组（去掉停牌日）；整块连续读出后再拆分，避免逐列跨步读盘
+        给定 lookback 时只读末尾的日期窗口：先读 lookback 个交易日，停牌导致有股票凑不够
+        lookback 根（且面板里还有更早的数据）时把窗口加倍重读，每只股票至少返回最近 lookback 根
+        """
+        total = len(self.dates)
+        window = total if lookback is None else min(total, lookback)
+        if lookback is not None:
+            # 旧面板没有记录行数时按 lookback 要求，最坏读到整个面板
+            need = np.array([min(lookback, s.get("rows", lookback)) for s in self.symbols[lo:hi]])
+        while True:
+            block = np.array(self.data[:, total - window:, lo:hi])
+            closes = block[self._field_index["close"]]
+            if window == total or (np.sum(~np.isnan(closes), axis=0) >= need).all():
+                break
+            window = min(total, window * 2)
+        dates = self.dates[total - window:]
+        result = []
+        for k in range(hi - lo):
+            ok = ~np.isnan(closes[:, k])
+            bars = np.empty(int(ok.sum()), dtype=BAR_DTYPE)
+            bars["date"] = dates[ok]
+            for i, name in enumerate(self.fields):
+                bars[name] = block[i, ok, k]
+            result.append(bars)
+        return result
+
+
+def open_panel(panel_dir=PANEL_DIR):
+    """打开已构建的面板；面板不存在时返回 None"""
+    if not os.path.exists(os.path.join(panel_dir, META_FILE)):
+        return None
+    return MarketPanel(panel_dir)
+
+
+if __name__ == "__main__":
+    build_panel()
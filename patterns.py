@@ -0,0 +1,277 @@
+import numpy as np
+
+# 形态检测器注册表：名称 -> {"func": 检测函数, "lookback": 需要的最近K线数, "columns": 输出的明细列}
+# 检测函数接收一只股票最近 lookback 根前复权K线（BAR_DTYPE 数组），
+# 命中时返回 {明细列: 值}，未命中返回 None
+# 新增形态只需在这里注册，scan.py 会在同一遍读取中一起运行
+# 可选的增量版本（scan_state.py 使用）："advance"(状态, 新K线) 原地推进每只股票的小状态，
+# "check"(状态) 由状态给出与检测函数相同的结果；状态只含可写入 JSON 的值
+DETECTORS = {}
+
+
+def register(name, lookback, columns=()):
+    def wrap(func):
+        DETECTORS[name] = {"func": func, "lookback": lookback, "columns": tuple(columns)}
+        return func
+    return wrap
+
+
+def register_state(name, advance, check):
+    DETECTORS[name]["advance"] = advance
+    DETECTORS[name]["check"] = check
+
+
+def max_lookback(names):
+    return max(DETECTORS[name]["lookback"] for name in names)
+
+
+# 九连跌
+NINE_DOWN_DAYS = 12
+NINE_DOWN_MIN = 9
+
+
+def is_nine_downward(closes):
+    # closes: 最近 NINE_DOWN_DAYS(12) 天的收盘价
+    # 12 个收盘价有 11 次逐日比较，其中至少 9 次下跌即命中（不要求连续下跌）
+    return int((np.diff(closes[-NINE_DOWN_DAYS:]) < 0).sum()) >= NINE_DOWN_MIN
+
+
+# 以下函数对 (日期, 股票) 二维收盘价一次算出每只股票每一天的结果（一维数组按单只股票处理），
+# 今天的结果取最后一行，整段历史可直接用于回测；NaN（停牌）处比较为假，连续计数中断
+
+
+def _shifted_compare(closes, lag, op):
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.zeros(closes.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        out[lag:] = op(closes[lag:], closes[:-lag])
+    return out
+
+
+def streak_lengths(condition):
+    """每个位置为止条件连续成立的天数（沿日期轴），不成立处为 0"""
+    total = np.cumsum(condition, axis=0, dtype=np.int32)
+    # 每次不成立时记下累计值，向后取最大即为最近一次中断时的累计值
+    reset = np.maximum.accumulate(np.where(condition, 0, total), axis=0)
+    return total - reset
+
+
+def down_streaks(closes, lag=1):
+    """连续满足 close < lag 天前 close 的天数；lag=1 为连续下跌天数，lag=4 为 TD 买入结构计数"""
+    return streak_lengths(_shifted_compare(closes, lag, np.less))
+
+
+def up_streaks(closes, lag=1):
+    """连续满足 close > lag 天前 close 的天数；lag=4 为 TD 卖出结构计数"""
+    return streak_lengths(_shifted_compare(closes, lag, np.greater))
+
+
+def td_setup(closes, lag=4):
+    """TD 序列的结构计数：(买入结构, 卖出结构)，计数达到 9 即为完成"""
+    return down_streaks(closes, lag), up_streaks(closes, lag)
+
+
+def _rolling_sum(values, window):
+    total = np.cumsum(values, axis=0, dtype=np.int32)
+    out = total.copy()
+    out[window:] -= total[:-window]
+    return out
+
+
+def window_down_days(closes, window=NINE_DOWN_DAYS - 1):
+    """截至每一天最近 window 次逐日比较中下跌的次数"""
+    return _rolling_sum(_shifted_compare(closes, 1, np.less), window)
+
+
+def nine_down_signal(closes):
+    """
+    每只股票每一天是否满足 is_nine_downward（价格按两位小数比较）；
+    窗口内有缺失或不足 NINE_DOWN_DAYS 天时为假
+    """
+    closes = np.round(np.asarray(closes, dtype=np.float64), 2)
+    complete = _rolling_sum(~np.isnan(closes), NINE_DOWN_DAYS) == NINE_DOWN_DAYS
+    return complete & (window_down_days(closes) >= NINE_DOWN_MIN)
+
+
+@register("nine_down", NINE_DOWN_DAYS, ("down_days",))
+def detect_nine_down(bars):
+    if len(bars) < NINE_DOWN_DAYS:
+        return None
+    closes = np.round(bars["close"][-NINE_DOWN_DAYS:], 2)
+    if np.isnan(closes).any() or not is_nine_downward(closes):
+        return None
+    return {"down_days": int((closes[1:] < closes[:-1]).sum())}
+
+
+def nine_down_advance(state, bars):
+    # 状态：最近 NINE_DOWN_DAYS 个收盘价（两位小数）
+    closes = state.get("closes", []) + [float(c) for c in np.round(bars["close"], 2)]
+    state["closes"] = closes[-NINE_DOWN_DAYS:]
+
+
+def nine_down_check(state):
+    bars = np.zeros(len(state.get("closes", [])), dtype=[("close", "<f8")])
+    bars["close"] = state.get("closes", [])
+    return detect_nine_down(bars)
+
+
+register_state("nine_down", nine_down_advance, nine_down_check)
+
+
+# TD 买入结构：连续 9 天以上收盘价低于 4 天前
+TD_LAG = 4
+TD_SETUP_DAYS = 30
+
+
+@register("td_buy_setup", TD_SETUP_DAYS, ("count",))
+def detect_td_buy_setup(bars):
+    count = int(down_streaks(np.round(bars["close"], 2), TD_LAG)[-1]) if len(bars) else 0
+    return {"count": count} if count >= NINE_DOWN_MIN else None
+
+
+def td_buy_setup_advance(state, bars):
+    # 状态：最近 TD_LAG 个收盘价和当前连续计数
+    previous = state.get("previous", [])
+    count = state.get("count", 0)
+    for close in np.round(bars["close"], 2):
+        count = count + 1 if len(previous) == TD_LAG and close < previous[0] else 0
+        previous = (previous + [float(close)])[-TD_LAG:]
+    state["previous"], state["count"] = previous, count
+
+
+def td_buy_setup_check(state):
+    # 批量版只看最近 TD_SETUP_DAYS 根K线，计数最多到 TD_SETUP_DAYS - TD_LAG
+    count = min(state.get("count", 0), TD_SETUP_DAYS - TD_LAG)
+    return {"count": count} if count >= NINE_DOWN_MIN else None
+
+
+register_state("td_buy_setup", td_buy_setup_advance, td_buy_setup_check)
+
+
+# 双底
+DOUBLE_BOTTOM_DAYS = 300
+DOUBLE_BOTTOM_LAST_DAYS = 10
+
+
+def stack_tails(bars_list, window):
+    """
+    多只股票最近 window 根K线叠成 (股票, window) 的二维K线数组
+    历史不足 window 根的股票不参与，返回 (二维K线, 参与的股票在 bars_list 中的下标)
+    """
+    keep = np.array([i for i, bars in enumerate(bars_list) if len(bars) >= window], dtype=int)
+    if not len(keep):
+        return None, keep
+    return np.stack([bars_list[i][-window:] for i in keep]), keep
+
+
+def _prefix_argmin(values):
+    """每行每个位置 k 上 values[:k+1] 的最小值下标（相同取最早），对应 np.argmin 的规则"""
+    running = np.minimum.accumulate(values, axis=-1)
+    is_new = np.ones(values.shape, dtype=bool)
+    is_new[..., 1:] = values[..., 1:] < running[..., :-1]
+    idx = np.where(is_new, np.arange(values.shape[-1]), 0)
+    return np.maximum.accumulate(idx, axis=-1)
+
+
+def double_bottoms(closes, dates, last_days=10, min_gap_days=40, price_diff_threshold=0.03):
+    """
+    批量双底检测：closes/dates 为 (股票, min_days)，即每只股票最近 min_days 根K线
+    点A: [0, min_days-last_days) 内收盘价最低的一天；点B: 最后 last_days 天中
+         第一天满足 |B-A|/A <= 阈值 且与A间隔不少于 min_gap_days 根K线
+    三个参数可以是标量或等长数组（参数网格），一次算完全部组合
+    返回 (命中, A下标, B下标, 差异比例)，形状均为 (参数组, 股票)，下标相对窗口起点
+    """
+    closes = np.round(np.atleast_2d(np.asarray(closes, dtype=np.float64)), 2)
+    dates = np.atleast_2d(dates)
+    last_days, min_gap_days, thresholds = (np.atleast_1d(x) for x in
+                                           np.broadcast_arrays(last_days, min_gap_days, price_diff_threshold))
+    n = closes.shape[1]
+    argmins = _prefix_argmin(closes)
+    a_index = argmins[:, n - last_days - 1].T                         # (参数组, 股票)
+    a_close = np.take_along_axis(closes, a_index.T, axis=1).T
+    a_date = np.take_along_axis(dates, a_index.T, axis=1).T
+
+    span = int(last_days.max())
+    b_index = np.arange(n - span, n)                                 # 按最长的 last_days 取候选B
+    b_close = closes[:, n - span:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = np.round(np.abs(b_close[None] - a_close[..., None]) / a_close[..., None], 4)
+    ok = ((b_index >= (n - last_days)[:, None, None])
+          & (diff <= thresholds[:, None, None])
+          & (dates[None, :, n - span:] > a_date[..., None])
+          & (b_index - a_index[..., None] >= min_gap_days[:, None, None]))
+    first = ok.argmax(axis=-1)
+    found = ok.any(axis=-1)
+    b_found = np.where(found, b_index[first], -1)
+    diff_found = np.where(found, np.take_along_axis(diff, first[..., None], axis=-1)[..., 0], np.nan)
+    return found, a_index, b_found, diff_found
+
+
+def double_bottom_details(bars, last_days=10, min_gap_days=40, price_diff_threshold=0.03,
+                          min_days=DOUBLE_BOTTOM_DAYS):
+    """单只股票的双底明细（与 scaner 输出的字段相同），没有时返回 None"""
+    if len(bars) < min_days:
+        return None
+    tail = bars[-min_days:]
+    found, a_index, b_index, diff = double_bottoms(tail["close"][None], tail["date"][None], last_days,
+                                                   min_gap_days, price_diff_threshold)
+    if not found[0, 0]:
+        return None
+    return double_bottom_result(tail, int(a_index[0, 0]), int(b_index[0, 0]), float(diff[0, 0]))
+
+
+def double_bottom_result(tail, a, b, diff):
+    """窗口内A、B下标对应的明细"""
+    return {
+        "a_date": str(tail["date"][a]),
+        "a_close": round(float(tail["close"][a]), 2),
+        "a_low": round(float(tail["low"][a]), 2),
+        "b_date": str(tail["date"][b]),
+        "b_close": round(float(tail["close"][b]), 2),
+        "b_low": round(float(tail["low"][b]), 2),
+        "diff": diff,
+        "gap_days": b - a,
+    }
+
+
+@register("double_bottom", DOUBLE_BOTTOM_DAYS, ("a_date", "a_low", "b_date", "b_low", "diff", "gap_days"))
+def detect_double_bottom(bars):
+    return double_bottom_details(bars, DOUBLE_BOTTOM_LAST_DAYS)
+
+
+def double_bottom_advance(state, bars):
+    """
+    状态：已处理的K线数 n、最近 last_days 根K线（候选B），
+    以及点A搜索范围 [n-min_days, n-last_days) 的单调队列（收盘价非递减，队首即最低价且相同取最早）
+    每根新K线均摊 O(1)；K线记为 [序号, 日期, 两位小数收盘价, 收盘价, 最低价]
+    """
+    n = state.get("n", 0)
+    recent = state.get("recent", [])
+    window = state.get("window", [])
+    for date, close_r, close, low in zip(bars["date"], np.round(bars["close"], 2), bars["close"], bars["low"]):
+        recent.append([n, str(date), float(close_r), float(close), float(low)])
+        n += 1
+        if len(recent) > DOUBLE_BOTTOM_LAST_DAYS:
+            item = recent.pop(0)  # 离开候选B，进入点A搜索范围
+            while window and window[-1][2] > item[2]:
+                window.pop()
+            window.append(item)
+        while window and window[0][0] < n - DOUBLE_BOTTOM_DAYS:
+            window.pop(0)
+    state["n"], state["recent"], state["window"] = n, recent, window
+
+
+def double_bottom_check(state, min_gap_days=40, price_diff_threshold=0.03):
+    if state.get("n", 0) < DOUBLE_BOTTOM_DAYS or not state["window"]:
+        return None
+    a_index, a_date, a_close_r, a_close, a_low = state["window"][0]
+    for b_index, b_date, b_close_r, b_close, b_low in state["recent"]:
+        diff = float(np.round(abs(b_close_r - a_close_r) / a_close_r, 4))
+        if diff <= price_diff_threshold and b_date > a_date and b_index - a_index >= min_gap_days:
+            return {"a_date": a_date, "a_close": round(a_close, 2), "a_low": round(a_low, 2),
+                    "b_date": b_date, "b_close": round(b_close, 2), "b_low": round(b_low, 2),
+                    "diff": diff, "gap_days": b_index - a_index}
+    return None
+
+
+register_state("double_bottom", double_bottom_advance, double_bottom_check)
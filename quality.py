@@ -0,0 +1,118 @@
+import os
+import json
+import numpy as np
+from barstore import BAR_DIR, load_bars, write_bars
+
+QUALITY_FILE = "quality.json"
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def validate_bars(bars, calendar=None):
+    """
+    一次性向量化检查一只股票的K线并修正，返回 (修正后的K线, 问题统计)
+    修正：按日期排序、重复日期保留最后一条、去掉价格缺失或非正的行、
+          high/low 与开收盘价不一致时取实际的最高/最低价
+    只标记不修正：与交易日历相比缺失的交易日（gaps）
+    """
+    issues = {}
+    if not len(bars):
+        return bars, issues
+    order = np.argsort(bars["date"], kind="stable")
+    issues["out_of_order"] = int((np.diff(bars["date"].astype(np.int64)) < 0).sum())
+    bars = bars[order]
+    # 重复日期：反转后 np.unique 取到的是每个日期最后一次出现的行
+    _, last = np.unique(bars["date"][::-1], return_index=True)
+    issues["duplicate_dates"] = len(bars) - len(last)
+    bars = bars[::-1][last]
+
+    # 只检查这只股票实际有的价格字段（整列缺失的字段不算问题）
+    fields = [name for name in PRICE_FIELDS if not np.isnan(bars[name]).all()]
+    prices = np.stack([bars[name] for name in fields]) if fields else np.empty((0, len(bars)))
+    missing = np.isnan(prices).any(axis=0)
+    non_positive = ~missing & (prices <= 0).any(axis=0)
+    issues["missing_price"] = int(missing.sum())
+    issues["non_positive_price"] = int(non_positive.sum())
+    bars = bars[~(missing | non_positive)]
+
+    if len(fields) == len(PRICE_FIELDS):
+        body_high = np.maximum(bars["open"], bars["close"])
+        body_low = np.minimum(bars["open"], bars["close"])
+        bad = (bars["high"] < bars["low"]) | (bars["high"] < body_high) | (bars["low"] > body_low)
+        issues["high_low"] = int(bad.sum())
+        if bad.any():
+            bars = bars.copy()
+            high = np.maximum(np.maximum(bars["high"], bars["low"]), body_high)
+            low = np.minimum(np.minimum(bars["high"], bars["low"]), body_low)
+            bars["high"], bars["low"] = high, low
+    if calendar is not None and len(calendar) and len(bars):
+        issues["gaps"] = int(len(calendar.missing_days(bars["date"])))
+    return bars, {name: count for name, count in issues.items() if count}
+
+
+class QualityReport:
+    """每只股票最近一次检查的结果（bars/quality.json），代码 -> {rows, dropped, issues}"""
+
+    def __init__(self, bar_dir=BAR_DIR):
+        self.path = os.path.join(bar_dir, QUALITY_FILE)
+        self.symbols = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.symbols = json.load(f)
+
+    def record(self, stock_code, rows, dropped, issues, append=False):
+        """append 为真时（增量追加的新行）累加到原记录上"""
+        item = self.symbols.get(stock_code) if append else None
+        if item is None:
+            self.symbols[stock_code] = {"rows": int(rows), "dropped": int(dropped), "issues": issues}
+            return
+        item["rows"] += int(rows)
+        item["dropped"] += int(dropped)
+        for name, count in issues.items():
+            item["issues"][name] = item["issues"].get(name, 0) + count
+
+    def flagged(self):
+        return {code: item for code, item in self.symbols.items() if item["issues"]}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.symbols, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def check_bars(stock_code, bars, report, calendar=None, append=False):
+    """入库前检查：返回修正后的K线，并把结果记入报告"""
+    clean, issues = validate_bars(bars, calendar)
+    report.record(stock_code, len(clean), len(bars) - len(clean), issues, append)
+    return clean
+
+
+def validate_all(bar_dir=BAR_DIR, calendar=None):
+    """检查K线目录下全部股票，有修正的文件原地重写"""
+    from catalog import open_catalog
+
+    catalog = open_catalog(bar_dir)
+    report = QualityReport(bar_dir)
+    fixed = 0
+    for entry in catalog:
+        file_path = catalog.file_path(entry)
+        if not os.path.exists(file_path):
+            continue
+        bars = load_bars(file_path)
+        clean = check_bars(entry["code"], bars, report, calendar)
+        if report.symbols[entry["code"]]["issues"].keys() - {"gaps"}:
+            write_bars(entry["name"], entry["code"], clean, bar_dir, catalog, entry.get("adjust"))
+            fixed += 1
+    catalog.save()
+    report.save()
+    flagged = report.flagged()
+    print(f"已检查 {len(catalog)} 只股票，修正 {fixed} 只，有问题 {len(flagged)} 只（详见 {report.path}）")
+    return report
+
+
+if __name__ == "__main__":
+    from trading_calendar import TradingCalendar
+
+    calendar = TradingCalendar()
+    validate_all(calendar=calendar if len(calendar) else None)
@@ -0,0 +1,189 @@
+import os
+import sys
+import numpy as np
+from adjust import adjust_prices, factor_path, load_factors, load_view
+from barstore import BAR_DIR, BAR_DTYPE, iter_bar_files, journal_path
+from intraday import INTRADAY_DIR, INTRADAY_DTYPE, load_intraday, intraday_path
+from catalog import find_bar_file, full_code, open_catalog
+
+RESAMPLE_DIR = "resampled"
+
+# 频率命名与 baostock 一致：分钟线 "5"/"15"/"30"/"60"，日/周/月线 "d"/"w"/"m"
+INTRADAY_FREQS = ("15", "30", "60")
+DAILY_FREQS = ("w", "m")
+
+# A股连续竞价时段（分钟数，K线以结束时间标记）：上午 9:30-11:30，下午 13:00-15:00
+MORNING_OPEN = 9 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+SESSION_MINUTES = 120
+
+
+def _group_starts(keys):
+    """keys 已按时间升序，返回每组第一行的下标"""
+    if not len(keys):
+        return np.empty(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _aggregate(bars, starts, out_dtype, label_field, labels):
+    """按组聚合 OHLC：开=首、收=末、高=最大、低=最小、量额求和（忽略 NaN）"""
+    ends = np.r_[starts[1:], len(bars)] - 1
+    out = np.empty(len(starts), dtype=out_dtype)
+    out[label_field] = labels
+    out["open"] = bars["open"][starts]
+    out["close"] = bars["close"][ends]
+    out["high"] = np.fmax.reduceat(bars["high"], starts)
+    out["low"] = np.fmin.reduceat(bars["low"], starts)
+    for name in ("volume", "amount"):
+        values = bars[name].astype("<f8")
+        summed = np.add.reduceat(np.nan_to_num(values), starts)
+        # 整组都缺失时保持 NaN
+        has_value = np.add.reduceat((~np.isnan(values)).astype(np.int64), starts) > 0
+        out[name] = np.where(has_value, summed, np.nan)
+    return out
+
+
+def session_labels(ts, minutes):
+    """
+    分钟线结束时间 -> 所属 minutes 分钟K线的结束时间
+    上午、下午分别从开盘起切分，午休不跨越，例如60分钟线为 10:30、11:30、14:00、15:00
+    """
+    day = ts.astype("datetime64[D]")
+    minute_of_day = (ts - day.astype("datetime64[m]")).astype(np.int64)
+    afternoon = minute_of_day > (MORNING_OPEN + SESSION_MINUTES + AFTERNOON_OPEN) // 2
+    session_open = np.where(afternoon, AFTERNOON_OPEN, MORNING_OPEN)
+    offset = np.clip(minute_of_day - session_open, 1, SESSION_MINUTES)
+    label = session_open + -(-offset // minutes) * minutes
+    return day.astype("datetime64[m]") + label.astype("timedelta64[m]")
+
+
+def resample_intraday(bars, frequency):
+    """5分钟线聚合为 15/30/60 分钟线或日线（frequency="d"）"""
+    if frequency == "d":
+        dates = bars["ts"].astype("datetime64[D]")
+        starts = _group_starts(dates)
+        return _aggregate(bars, starts, BAR_DTYPE, "date", dates[starts])
+    labels = session_labels(bars["ts"], int(frequency))
+    starts = _group_starts(labels)
+    return _aggregate(bars, starts, INTRADAY_DTYPE, "ts", labels[starts])
+
+
+def period_keys(dates, frequency):
+    """日期 -> 周/月分组键；周从周一开始（1970-01-01 是周四）"""
+    if frequency == "w":
+        return (dates.astype(np.int64) + 3) // 7
+    if frequency == "m":
+        return dates.astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"不支持的频率: {frequency}")
+
+
+def resample_daily(bars, frequency):
+    """日线聚合为周线/月线，以该周期最后一个交易日为日期"""
+    starts = _group_starts(period_keys(bars["date"], frequency))
+    ends = np.r_[starts[1:], len(bars)] - 1
+    return _aggregate(bars, starts, BAR_DTYPE, "date", bars["date"][ends])
+
+
+def resample_panel(panel, frequency):
+    """
+    全市场面板一次性聚合为周线/月线（所有股票同时计算）
+    返回 (周期日期, {字段: 周期×股票 数组})，停牌导致的 NaN 不参与计算
+    """
+    keys = period_keys(panel.dates, frequency)
+    starts = _group_starts(keys)
+    ends = np.r_[starts[1:], len(keys)] - 1
+    close = panel.field("close")
+    valid = ~np.isnan(close)
+    rows = np.arange(len(keys))[:, None]
+    # 每组每只股票第一个/最后一个有效行
+    first = np.minimum.reduceat(np.where(valid, rows, len(keys)), starts, axis=0)
+    last = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+    has = last >= 0
+    cols = np.arange(close.shape[1])[None, :]
+    out = {}
+    out["open"] = np.where(has, panel.field("open")[np.minimum(first, len(keys) - 1), cols], np.nan)
+    out["close"] = np.where(has, close[np.maximum(last, 0), cols], np.nan)
+    out["high"] = np.fmax.reduceat(panel.field("high"), starts, axis=0)
+    out["low"] = np.fmin.reduceat(panel.field("low"), starts, axis=0)
+    for name in ("volume", "amount"):
+        values = panel.field(name)
+        summed = np.add.reduceat(np.nan_to_num(values), starts, axis=0)
+        out[name] = np.where(np.add.reduceat((~np.isnan(values)).astype(np.int64), starts, axis=0) > 0,
+                             summed, np.nan)
+    return panel.dates[ends], out
+
+
+def _cache_path(source_path, frequency):
+    return os.path.join(RESAMPLE_DIR, frequency, os.path.basename(source_path))
+
+
+def _source_mtime(paths):
+    return max(os.path.getmtime(path) for path in paths if os.path.exists(path))
+
+
+def _cached(source_path, frequency, compute, depends=()):
+    """源文件（及其日志、depends 中的文件）比缓存新时重新计算，否则直接读缓存"""
+    cache_path = _cache_path(source_path, frequency)
+    paths = [source_path, journal_path(source_path)] + list(depends)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= _source_mtime(paths):
+        return np.load(cache_path)
+    bars = compute()
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, bars)
+    os.replace(tmp_path, cache_path)
+    return bars
+
+
+def load_resampled(stock_code, frequency, bar_dir=BAR_DIR, intraday_dir=INTRADAY_DIR):
+    """
+    读取任意周期的前复权K线，不需要联网：
+    "d" 为日线；"w"/"m" 由前复权日线聚合；"15"/"30"/"60" 由不复权5分钟线聚合后再复权
+    （分钟线的一根K线不会跨日，先聚合后复权结果相同，缓存里存不复权数据，复权因子变化不用重算）
+    """
+    if frequency == "d":
+        return load_view(find_bar_file(stock_code, bar_dir), bar_dir=bar_dir)
+    code = full_code(stock_code)
+    if frequency in DAILY_FREQS:
+        source = find_bar_file(stock_code, bar_dir)
+        return _cached(source, frequency, lambda: resample_daily(load_view(source, bar_dir=bar_dir), frequency),
+                       depends=[factor_path(code, bar_dir)])
+    if frequency in INTRADAY_FREQS:
+        source = intraday_path(code, intraday_dir)
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"未找到股票代码 {stock_code} 的5分钟线数据")
+        # 分钟线库存的是不复权价格，缺少因子表时直接返回会把不复权价格当成前复权
+        if not os.path.exists(factor_path(code, bar_dir)):
+            raise FileNotFoundError(f"未找到股票代码 {stock_code} 的复权因子，请先运行 python adjust.py {code}")
+        bars = _cached(source, frequency, lambda: resample_intraday(load_intraday(code, intraday_dir), frequency))
+        return adjust_prices(bars, load_factors(code, bar_dir))
+    raise ValueError(f"不支持的频率: {frequency}")
+
+
+def resample_universe(frequencies=DAILY_FREQS + INTRADAY_FREQS, bar_dir=BAR_DIR, intraday_dir=INTRADAY_DIR):
+    """预先为全市场生成并缓存各周期K线"""
+    catalog = open_catalog(bar_dir)
+    count = 0
+    for frequency in frequencies:
+        if frequency in DAILY_FREQS:
+            for source in iter_bar_files(bar_dir):
+                entry = catalog.entry_for_file(source)
+                depends = [factor_path(entry["code"], bar_dir)] if entry else []
+                _cached(source, frequency, lambda: resample_daily(load_view(source, bar_dir=bar_dir, catalog=catalog),
+                                                                  frequency), depends)
+                count += 1
+        else:
+            five_dir = os.path.join(intraday_dir, "5")
+            names = sorted(n for n in os.listdir(five_dir) if n.endswith(".npy")) if os.path.isdir(five_dir) else []
+            for name in names:
+                code = name[:-len(".npy")]
+                source = intraday_path(code, intraday_dir)
+                _cached(source, frequency, lambda: resample_intraday(load_intraday(code, intraday_dir), frequency))
+                count += 1
+    print(f"已生成 {count} 个周期K线文件到 {RESAMPLE_DIR}/")
+    return count
+
+
+if __name__ == "__main__":
+    resample_universe(tuple(sys.argv[1:]) or DAILY_FREQS + INTRADAY_FREQS)
@@ -0,0 +1,165 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import datetime
+import multiprocessing as mp
+from adjust import load_view
+from barstore import BAR_DIR, parse_file_name
+from catalog import open_catalog
+from panel import PANEL_DIR, MarketPanel
+from patterns import DETECTORS, max_lookback
+from scan_state import scan_incremental
+from universe_filter import tradable_files
+
+
+def scan_symbol(bars, names):
+    """对一只股票依次运行各检测器，返回 {形态名: 明细}（只含命中的形态）"""
+    hits = {}
+    for name in names:
+        detector = DETECTORS[name]
+        result = detector["func"](bars[-detector["lookback"]:])
+        if result:
+            hits[name] = result
+    return hits
+
+
+def _scan_files(task):
+    """进程任务：一段K线文件。只传文件路径，各进程自己以内存映射读取文件末尾"""
+    start, file_paths, names, bar_dir = task
+    catalog = open_catalog(bar_dir)
+    tail = max_lookback(names)
+    found = []
+    for k, file_path in enumerate(file_paths):
+        try:
+            bars = load_view(file_path, bar_dir=bar_dir, catalog=catalog, tail=tail)
+        except (ValueError, IOError) as e:
+            print(f"处理文件 {file_path} 时出错: {str(e)}")
+            continue
+        hits = scan_symbol(bars, names)
+        if hits:
+            stock_name, stock_code = parse_file_name(file_path)
+            found.append((start + k, stock_name, stock_code, hits))
+    return found
+
+
+def _scan_panel(task):
+    """进程任务：面板的一段列。各进程打开同一个内存映射面板，进程间不传K线数据"""
+    lo, hi, total, names, panel_dir = task
+    panel = MarketPanel(panel_dir)
+    if len(panel.symbols) != total:
+        raise RuntimeError(f"扫描过程中面板被重建（股票数 {total} -> {len(panel.symbols)}），请重新扫描")
+    found = []
+    # 只读各检测器最长回看窗口覆盖的末尾日期，不必读出整个历史
+    for k, bars in enumerate(panel.symbol_bars(lo, hi, max_lookback(names))):
+        hits = scan_symbol(bars, names)
+        if hits:
+            symbol = panel.symbols[lo + k]
+            found.append((lo + k, symbol["name"], symbol["code"], hits))
+    return found
+
+
+def scan_market(names=None, bar_dir=BAR_DIR, workers=1, panel_dir=None):
+    """
+    单遍扫描全市场：每只股票只读一次（只读各检测器中最长的回看窗口），
+    在同一份K线上运行全部已注册的检测器；增加形态不增加读盘次数
+    workers > 1 时把股票分成若干段交给进程池；panel_dir 给定时从内存映射面板读取（python panel.py 生成）
+    结果按股票原顺序合并，与进程数和完成顺序无关
+    返回 [(名称, 代码, {形态名: 明细})]，只含至少命中一个形态的股票
+    """
+    names = list(names or DETECTORS)
+    if panel_dir:
+        total = len(MarketPanel(panel_dir).symbols)
+    else:
+        file_paths = tradable_files(bar_dir)
+        total = len(file_paths)
+    # 每个进程约分到 4 段，段太大时各进程完成时间不均
+    step = max(1, -(-total // (max(workers, 1) * 4)))
+    if panel_dir:
+        func = _scan_panel
+        tasks = [(lo, min(lo + step, total), total, names, panel_dir) for lo in range(0, total, step)]
+    else:
+        func = _scan_files
+        tasks = [(lo, file_paths[lo:lo + step], names, bar_dir) for lo in range(0, total, step)]
+    if workers <= 1:
+        parts = [func(task) for task in tasks]
+    else:
+        with mp.Pool(workers) as pool:
+            parts = list(pool.imap_unordered(func, tasks))
+    merged = sorted((item for part in parts for item in part), key=lambda item: item[0])
+    return [(stock_name, stock_code, hits) for _, stock_name, stock_code, hits in merged]
+
+
+def benchmark(worker_counts, names=None, bar_dir=BAR_DIR, panel_dir=None):
+    """用不同进程数各扫描一次，核对结果一致并报告相对单进程的加速比"""
+    timings = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        results = scan_market(names, bar_dir, workers, panel_dir)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = results
+        elif results != baseline:
+            raise RuntimeError(f"{workers} 个进程的扫描结果与 {worker_counts[0]} 个进程不一致")
+        timings.append((workers, elapsed))
+    base = timings[0][1]
+    print(f"{'进程数':>6} {'耗时(秒)':>10} {'加速比':>8} {'效率':>8}")
+    for workers, elapsed in timings:
+        speedup = base / elapsed if elapsed > 0 else 0.0
+        print(f"{workers:>6} {elapsed:>10.2f} {speedup:>8.2f} {speedup / workers * timings[0][0]:>8.0%}")
+    return timings
+
+
+def write_results(results, names, csv_file):
+    """
+    合并结果表：每个形态一列命中标记（1/0），后面跟该形态的明细列（形态名_列名）
+    """
+    header = ["stock_name", "stock_code"] + names
+    for name in names:
+        header += [f"{name}_{column}" for column in DETECTORS[name]["columns"]]
+    with open(csv_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for stock_name, stock_code, hits in results:
+            row = [stock_name, stock_code] + [1 if name in hits else 0 for name in names]
+            for name in names:
+                detail = hits.get(name, {})
+                row += [detail.get(column, "") for column in DETECTORS[name]["columns"]]
+            writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="单遍扫描全市场形态")
+    parser.add_argument("patterns", nargs="*", help=f"要运行的形态，默认全部：{', '.join(DETECTORS)}")
+    parser.add_argument("--workers", type=int, default=1, help="扫描进程数")
+    parser.add_argument("--panel", action="store_true", help="从全市场面板读取（先运行 python panel.py）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量扫描：只处理上次扫描后新增的K线（状态保存在 bars/scan_state.json）")
+    parser.add_argument("--benchmark", help="逗号分隔的进程数，如 1,2,4,8：比较耗时和加速比，不输出结果表")
+    args = parser.parse_args(argv)
+    names = args.patterns or list(DETECTORS)
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        print(f"未知形态: {', '.join(unknown)}，可选: {', '.join(DETECTORS)}")
+        return None
+    panel_dir = PANEL_DIR if args.panel else None
+    if args.benchmark:
+        return benchmark([int(n) for n in args.benchmark.split(",")], names, panel_dir=panel_dir)
+    if args.incremental:
+        results, counts = scan_incremental(names)
+        print(f"增量扫描：重建 {counts['rebuilt']} 只，推进 {counts['advanced']} 只，无新数据 {counts['unchanged']} 只")
+    else:
+        results = scan_market(names, workers=args.workers, panel_dir=panel_dir)
+    csv_file = f"scan-{datetime.datetime.now().strftime('%m%d')}.csv"
+    write_results(results, names, csv_file)
+    print(f"\n===== 扫描结果 =====")
+    for name in names:
+        print(f"{name}: {sum(name in hits for _, _, hits in results)} 只")
+    print(f"结果已保存到: {os.path.abspath(csv_file)}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
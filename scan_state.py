@@ -0,0 +1,103 @@
+import os
+import json
+from adjust import load_factors, load_view
+from barstore import BAR_DIR, ADJUST_RAW
+from catalog import open_catalog
+from patterns import DETECTORS, max_lookback
+from universe_filter import tradable_files
+
+STATE_FILE = "scan_state.json"
+
+
+class ScanState:
+    """
+    每只股票的增量扫描状态（bars/scan_state.json），代码 ->
+        {"last_date", "rows", "factor", "detectors": {形态名: 状态}, "hits": {形态名: 明细}}
+    状态对应的检测器集合变化时整体作废
+    """
+
+    def __init__(self, names, bar_dir=BAR_DIR):
+        self.path = os.path.join(bar_dir, STATE_FILE)
+        self.names = list(names)
+        self.symbols = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("names") == self.names:
+                self.symbols = data["symbols"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"names": self.names, "symbols": self.symbols}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def latest_factor(entry, bar_dir=BAR_DIR):
+    """前复权的基准（最新后复权系数）；有新的除权除息时变化，此前的前复权价格全部改变"""
+    if entry.get("adjust") != ADJUST_RAW:
+        return 1.0
+    factors = load_factors(entry["code"], bar_dir)
+    return float(factors["back"][-1]) if len(factors) else 1.0
+
+
+def _advance(item, bars, names):
+    for name in names:
+        DETECTORS[name]["advance"](item["detectors"].setdefault(name, {}), bars)
+
+
+def scan_incremental(names=None, bar_dir=BAR_DIR):
+    """
+    增量扫描：每只股票只读上次扫描之后新追加的K线，用它推进各检测器的小状态；
+    没有新K线的股票不读文件，直接沿用上次结果。以下情况按最长回看窗口重建这只股票的状态：
+    还没有状态、行数对不上（文件被重写）、有新的除权除息（前复权价格整体变化）
+    返回与 scan.scan_market 相同格式的结果和 {"rebuilt", "advanced", "unchanged"} 计数
+    """
+    names = list(names or DETECTORS)
+    missing = [name for name in names if "advance" not in DETECTORS[name]]
+    if missing:
+        raise ValueError(f"以下形态没有增量实现: {', '.join(missing)}")
+    tail = max_lookback(names)
+    catalog = open_catalog(bar_dir)
+    state = ScanState(names, bar_dir)
+    counts = {"rebuilt": 0, "advanced": 0, "unchanged": 0}
+    results = []
+    seen = set()
+    for file_path in tradable_files(bar_dir):
+        entry = catalog.entry_for_file(file_path)
+        if entry is None or not entry["rows"]:
+            continue
+        code = entry["code"]
+        seen.add(code)
+        item = state.symbols.get(code)
+        factor = latest_factor(entry, bar_dir)
+        new_rows = entry["rows"] - item["rows"] if item else 0
+        if item and item["factor"] == factor and item["last_date"] == entry["last_date"] and new_rows == 0:
+            counts["unchanged"] += 1
+        else:
+            bars = None
+            if item and item["factor"] == factor and new_rows > 0:
+                bars = load_view(file_path, bar_dir=bar_dir, catalog=catalog, tail=new_rows)
+                if str(bars["date"][0]) <= item["last_date"]:
+                    bars = None  # 新行与状态衔接不上，重建
+            if bars is not None:
+                counts["advanced"] += 1
+            else:
+                bars = load_view(file_path, bar_dir=bar_dir, catalog=catalog, tail=tail)
+                item = {"detectors": {}}
+                counts["rebuilt"] += 1
+            _advance(item, bars, names)
+            item.update(last_date=str(bars["date"][-1]), rows=entry["rows"], factor=factor)
+            item["hits"] = {}
+            for name in names:
+                result = DETECTORS[name]["check"](item["detectors"][name])
+                if result:
+                    item["hits"][name] = result
+            state.symbols[code] = item
+        if item["hits"]:
+            results.append((entry["name"], code.split('.')[-1], item["hits"]))
+    # 移出股票池的股票不再保留状态
+    state.symbols = {code: item for code, item in state.symbols.items() if code in seen}
+    state.save()
+    return results, counts
@@ -1,93 +1,65 @@
 import os
-import json
-import glob
 import csv
 import datetime
+import numpy as np
+from adjust import load_view
+from barstore import BAR_DIR, BAR_DTYPE, parse_file_name
+from patterns import double_bottom_details, double_bottom_result, double_bottoms, stack_tails
+from universe_filter import tradable_files
 
-def find_double_bottom(stock_data, file_path, min_days=300, price_diff_threshold=0.03, last_days=10, min_gap_days=40):
-    if len(stock_data) < min_days:
-        print(f"{file_path} 数据不足{min_days}天，实际{len(stock_data)}天")
+def find_double_bottom(bars, file_path, min_days=300, price_diff_threshold=0.03, last_days=10, min_gap_days=40):
+    # 向量化实现见 patterns.double_bottoms，这里只处理单只股票并打印结果
+    if len(bars) < min_days:
+        print(f"{file_path} 数据不足{min_days}天，实际{len(bars)}天")
         return None
-    data = []
-    for item in stock_data:
-        try:
-            converted = {
-                "date": item["date"],
-                "close": round(float(item["close"]), 2),
-                "low": round(float(item["low"]), 2)
-            }
-            data.append(converted)
-        except (ValueError, TypeError, KeyError):
-            continue
-    if len(data) < min_days:
-        print(f"清洗后数据不足{min_days}天，实际{len(data)}天")
-        return None
-    last_lookback = data[-min_days:-last_days]  # 点A搜索范围
-    point_a = min(last_lookback, key=lambda x: x["close"])
-    a_index = data.index(point_a)
-    a_close = point_a["close"]
-    a_low = point_a["low"]
-    a_date = point_a["date"]
-    last_x_days = data[-last_days:]
-    for point_b in last_x_days:
-        b_index = data.index(point_b)
-        b_close = point_b["close"]
-        b_low = point_b["low"]
-        b_date = point_b["date"]
-        price_diff = abs(b_close - a_close)
-        price_diff_percent = round(price_diff / a_close, 4)
-        gap_days = b_index - a_index
-        if (
-            price_diff_percent <= price_diff_threshold
-            and b_date > a_date
-            and gap_days >= min_gap_days
-        ):
-            print(f"找到双底: A={a_close} {a_date}, B={b_close} {b_date}, 差异={price_diff_percent:.2%}, 间隔天数={gap_days}")
-            return {
-                "a_date": a_date,
-                "a_low": a_low,
-                "b_date": b_date,
-                "b_low": b_low,
-                "diff": price_diff_percent,
-                "gap_days": gap_days
-            }
-    return None
+    result = double_bottom_details(bars, last_days, min_gap_days, price_diff_threshold, min_days)
+    if result:
+        _print_found(result)
+    return result
+
+def _print_found(result):
+    print(f"找到双底: A={result['a_close']} {result['a_date']}, B={result['b_close']} {result['b_date']}, "
+          f"差异={result['diff']:.2%}, 间隔天数={result['gap_days']}")
 
-def analyze_stock_files(directory, last_days=10, min_gap_days=40):
-    json_files = glob.glob(os.path.join(directory, "*.json"))
-    print(f"找到 {len(json_files)} 个 JSON 文件")
+def analyze_stock_files(directory, last_days=10, min_gap_days=40, min_days=300):
+    bar_files = tradable_files(directory)
+    print(f"找到 {len(bar_files)} 个K线文件")
     double_bottom_stocks = []
-    for file_path in json_files:
+    all_bars = []
+    for file_path in bar_files:
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                stock_data = json.load(f)
-            if not stock_data or not isinstance(stock_data, list):
-                print(f"无效数据: {file_path}, type: {type(stock_data)}, 内容: {str(stock_data)[:100]}")
-                continue
-            result = find_double_bottom(stock_data, file_path, last_days=last_days, min_gap_days=min_gap_days)
-            if result:
-                filename = os.path.basename(file_path)
-                base = filename.replace('.json', '')
-                if '-' in base:
-                    stock_name, stock_code = base.rsplit('-', 1)
-                    stock_code = f"'{stock_code}"
-                else:
-                    stock_name = base
-                    stock_code = ""
-                double_bottom_stocks.append([
-                    stock_name,
-                    stock_code,
-                    result["a_date"],
-                    result["a_low"],
-                    result["b_date"],
-                    result["b_low"],
-                    f"{round(result['diff']*100, 2)}%",
-                    result["gap_days"]
-                ])
-                print(f"发现双底形态: {filename}")
-        except (json.JSONDecodeError, IOError, PermissionError) as e:
+            # 形态只看最近 min_days 根K线，不读更早的历史
+            bars = load_view(file_path, bar_dir=directory, tail=min_days)
+        except (ValueError, IOError, PermissionError) as e:
             print(f"处理文件 {file_path} 时出错: {str(e)}")
-            continue
+            bars = None
+        if bars is not None and not len(bars):
+            print(f"无效数据: {file_path}, 空文件")
+        elif bars is not None and len(bars) < min_days:
+            print(f"{file_path} 数据不足{min_days}天，实际{len(bars)}天")
+        all_bars.append(bars if bars is not None else np.empty(0, BAR_DTYPE))
+    # 全部股票一次性检测
+    tails, keep = stack_tails(all_bars, min_days)
+    if tails is not None:
+        found, a_index, b_index, diff = double_bottoms(tails["close"], tails["date"], last_days, min_gap_days)
+        for k in np.flatnonzero(found[0]):
+            file_path = bar_files[keep[k]]
+            result = double_bottom_result(tails[k], int(a_index[0, k]), int(b_index[0, k]), float(diff[0, k]))
+            _print_found(result)
+            stock_name, stock_code = parse_file_name(file_path)
+            if stock_code:
+                stock_code = f"'{stock_code}"
+            double_bottom_stocks.append([
+                stock_name,
+                stock_code,
+                result["a_date"],
+                result["a_low"],
+                result["b_date"],
+                result["b_low"],
+                f"{round(result['diff']*100, 2)}%",
+                result["gap_days"]
+            ])
+            print(f"发现双底形态: {os.path.basename(file_path)}")
     # 自动生成CSV文件名
     today = datetime.datetime.now().strftime("%m%d")
     csv_file = f"result-{today}.csv"
@@ -97,7 +69,7 @@ def analyze_stock_files(directory, last_days=10, min_gap_days=40):
         for row in double_bottom_stocks:
             writer.writerow(row)
     print(f"\n===== 分析结果 =====")
-    print(f"扫描文件总数: {len(json_files)}")
+    print(f"扫描文件总数: {len(bar_files)}")
     print(f"发现双底形态的股票数: {len(double_bottom_stocks)}")
     print(f"结果已保存到: {csv_file}")
     if double_bottom_stocks:
@@ -106,5 +78,5 @@ def analyze_stock_files(directory, last_days=10, min_gap_days=40):
             print(f"  - {row[0]}")
 
 if __name__ == "__main__":
-    data_directory = "data"
+    data_directory = BAR_DIR
     analyze_stock_files(data_directory, last_days=10, min_gap_days=40)
\ No newline at end of file
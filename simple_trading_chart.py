@@ -5,8 +5,10 @@ import matplotlib.dates as mdates
 from datetime import datetime
 import seaborn as sns
 from fn_2 import SingleStockMomentumVolBreakoutStrategy
-import json
 import os
+from adjust import load_view
+from barstore import bars_to_frame
+from catalog import find_bar_file
 
 # 设置中文字体和样式
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
@@ -15,19 +17,8 @@ plt.style.use('seaborn-v0_8')
 
 def load_stock_data(stock_code='601360', start_date='2024-01-01', end_date='2025-08-18'):
     """加载股票数据"""
-    data_dir = "data"
-    matches = [f for f in os.listdir(data_dir) if stock_code in f and f.endswith('.json')]
-    if not matches:
-        raise FileNotFoundError(f'No data file found for code: {stock_code}')
-    
-    file_path = os.path.join(data_dir, matches[0])
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    df = pd.DataFrame(data)
-    df['date'] = pd.to_datetime(df['date'])
-    for col in ('open', 'high', 'low', 'close'):
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    file_path = find_bar_file(stock_code)
+    df = bars_to_frame(load_view(file_path))
     
     df = df.dropna(subset=['open', 'high', 'low', 'close'])
     df = df[(df['date'] >= pd.to_datetime(start_date)) & 
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+
+TELEMETRY_DIR = os.environ.get("TELEMETRY_DIR", "telemetry")
+# 设为 1 时额外输出 Prometheus 文本格式（node_exporter textfile collector 可直接读取）
+PROMETHEUS = os.environ.get("TELEMETRY_PROM", "0") == "1"
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = np.asarray(buckets)
+        self.counts = np.zeros(len(buckets) + 1, dtype=np.int64)  # 最后一个桶为 +Inf
+        self.samples = []
+
+    def observe(self, value):
+        self.counts[np.searchsorted(self.buckets, value)] += 1
+        self.samples.append(value)
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0, "sum": 0.0}
+        p50, p95, p99 = np.percentile(self.samples, [50, 95, 99])
+        return {"count": len(self.samples), "sum": float(np.sum(self.samples)), "p50": float(p50),
+                "p95": float(p95), "p99": float(p99), "max": float(np.max(self.samples)),
+                "buckets": {str(le): int(c) for le, c in zip(list(self.buckets) + ["+Inf"], np.cumsum(self.counts))}}
+
+
+class Telemetry:
+    """
+    一次运行的指标：计数器、延迟直方图、分阶段耗时
+    结束时 write() 输出 JSON 汇总（可选 Prometheus 文本），便于比较不同版本的吞吐和延迟
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.counters = {}
+        self.histograms = {}
+        self.stages = {}
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def add_time(self, stage, seconds, calls=1):
+        total, count = self.stages.get(stage, (0.0, 0))
+        self.stages[stage] = (total + seconds, count + calls)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self._start
+        return {
+            "job": self.job,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "elapsed": elapsed,
+            "counters": dict(self.counters),
+            "rates": {name: value / elapsed for name, value in self.counters.items() if elapsed > 0},
+            "stages": {name: {"seconds": total, "calls": count} for name, (total, count) in self.stages.items()},
+            "histograms": {name: h.summary() for name, h in self.histograms.items()},
+        }
+
+    def prometheus(self):
+        """Prometheus 文本格式"""
+        prefix = "stocks_" + self.job.replace("-", "_").replace(".", "_")
+        lines = [f"{prefix}_elapsed_seconds {time.perf_counter() - self._start:.6f}"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, (total, count) in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {count}')
+        for name, h in sorted(self.histograms.items()):
+            for le, c in zip(list(h.buckets) + ["+Inf"], np.cumsum(h.counts)):
+                lines.append(f'{prefix}_{name}_seconds_bucket{{le="{le}"}} {c}')
+            lines.append(f"{prefix}_{name}_seconds_sum {float(np.sum(h.samples)):.6f}")
+            lines.append(f"{prefix}_{name}_seconds_count {len(h.samples)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory=TELEMETRY_DIR, prometheus=PROMETHEUS):
+        """写出 <job>-<时间>.json 和 <job>-latest.json，返回汇总"""
+        summary = self.summary()
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        text = json.dumps(summary, ensure_ascii=False, indent=2)
+        for name in (f"{self.job}-{stamp}.json", f"{self.job}-latest.json"):
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write(text)
+        if prometheus:
+            tmp_path = os.path.join(directory, f"{self.job}.prom.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(tmp_path, os.path.join(directory, f"{self.job}.prom"))
+        return summary
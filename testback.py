@@ -4,7 +4,6 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
 import os
-import json
 import sys
 import warnings
 warnings.filterwarnings('ignore')
@@ -12,6 +11,11 @@ warnings.filterwarnings('ignore')
 # 导入策略类
 from fn_1 import TechStockStrategy
 from fn_2 import SingleStockMomentumVolBreakoutStrategy
+from adjust import load_view
+from barstore import bars_to_frame
+from catalog import find_bar_file
+from intraday import intraday_to_frame
+from resample import INTRADAY_FREQS, load_resampled
 
 class BacktestEngine:
     """
@@ -31,43 +35,28 @@ class BacktestEngine:
         else:
             self.strategy = TechStockStrategy()
         
-    def load_stock_data(self, stock_code, start_date, end_date):
+    def load_stock_data(self, stock_code, start_date, end_date, frequency='d'):
         """
-        从data文件夹加载股票数据
-        输入：股票代码、开始日期、结束日期
+        从K线目录加载股票数据
+        输入：股票代码、开始日期、结束日期、K线周期（d/w/m 或 15/30/60 分钟，由本地数据聚合）
         """
-        # 查找匹配的数据文件
-        data_dir = "data"
-        if not os.path.exists(data_dir):
-            raise FileNotFoundError(f"数据目录 {data_dir} 不存在")
-        
-        # 查找包含股票代码的文件
-        matching_files = []
-        for file in os.listdir(data_dir):
-            if stock_code in file and file.endswith('.json'):
-                matching_files.append(file)
-        
-        if not matching_files:
-            raise FileNotFoundError(f"未找到股票代码 {stock_code} 的数据文件")
-        
-        # 加载第一个匹配的文件
-        file_path = os.path.join(data_dir, matching_files[0])
-        print(f"加载数据文件: {file_path}")
+        if frequency == 'd':
+            # 查找匹配的数据文件
+            file_path = find_bar_file(stock_code)
+            print(f"加载数据文件: {file_path}")
+        else:
+            print(f"加载 {stock_code} 的 {frequency} 周期K线")
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 转换为DataFrame
-            df = pd.DataFrame(data)
-            
-            # 转换数据类型
-            df['date'] = pd.to_datetime(df['date'])
-            df['open'] = pd.to_numeric(df['open'])
-            df['high'] = pd.to_numeric(df['high'])
-            df['low'] = pd.to_numeric(df['low'])
-            df['close'] = pd.to_numeric(df['close'])
-            df['amount'] = pd.to_numeric(df['amount'])
+            # 转换为DataFrame（K线文件中已是数值类型）
+            if frequency == 'd':
+                df = bars_to_frame(load_view(file_path))
+            elif frequency in INTRADAY_FREQS:
+                df = intraday_to_frame(load_resampled(stock_code, frequency))
+                df = df.rename(columns={'timestamps': 'date'})
+                df['date'] = pd.to_datetime(df['date'])
+            else:
+                df = bars_to_frame(load_resampled(stock_code, frequency))
             
             # 添加volume列（如果数据中没有）
             if 'volume' not in df.columns:
@@ -457,7 +446,7 @@ class BacktestEngine:
                           f"价格: {trade['price']:.2f} 数量: {trade['shares']} "
                           f"盈亏: {profit:.2f} 原因: {trade['reason']}")
     
-    def run_backtest(self, stock_code, start_date, end_date):
+    def run_backtest(self, stock_code, start_date, end_date, frequency='d'):
         """
         运行完整的回测流程
         """
@@ -467,7 +456,7 @@ class BacktestEngine:
         
         try:
             # 1. 加载数据
-            df = self.load_stock_data(stock_code, start_date, end_date)
+            df = self.load_stock_data(stock_code, start_date, end_date, frequency)
             
             # 2. 计算指标
             df = self.calculate_all_indicators(df)
@@ -0,0 +1,147 @@
+import os
+import sys
+import importlib
+from datetime import date
+import numpy as np
+from barstore import BAR_DIR
+
+CALENDAR_FILE = "calendar.npz"
+CALENDAR_START = "1990-12-19"  # 沪市开市
+
+
+def _days(dates):
+    return np.asarray(dates, dtype="datetime64[D]")
+
+
+class TradingCalendar:
+    """
+    本地缓存的交易日历（bars/calendar.npz），所有查询都是对交易日数组的 searchsorted，
+    参数可以是单个日期也可以是日期数组
+    """
+
+    def __init__(self, bar_dir=BAR_DIR):
+        self.path = os.path.join(bar_dir, CALENDAR_FILE)
+        self.days = np.empty(0, dtype="datetime64[D]")
+        self.covered_end = None  # 日历覆盖到的最后一个自然日（含非交易日）
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.days = data["days"]
+                self.covered_end = data["covered_end"][()]
+
+    def __len__(self):
+        return len(self.days)
+
+    def stale(self, today=None):
+        today = np.datetime64(today or date.today().isoformat(), "D")
+        return self.covered_end is None or self.covered_end < today
+
+    def refresh(self, bs, end_date=None):
+        """从 baostock 取日历上次覆盖之后的部分（一次查询）"""
+        end_date = end_date or date.today().isoformat()
+        start = str(self.covered_end + 1) if self.covered_end is not None else CALENDAR_START
+        if start > end_date:
+            return 0
+        rs = bs.query_trade_dates(start_date=start, end_date=end_date)
+        if rs.error_code != '0':
+            raise RuntimeError(f"{rs.error_code} {rs.error_msg}")
+        rows = []
+        while (rs.error_code == '0') & rs.next():
+            rows.append(rs.get_row_data())
+        if not rows:
+            return 0
+        columns = dict(zip(rs.fields, zip(*rows)))
+        calendar_dates = _days(columns["calendar_date"])
+        new_days = calendar_dates[np.asarray(columns["is_trading_day"]) == "1"]
+        self.days = np.union1d(self.days, new_days)
+        self.covered_end = calendar_dates.max()
+        return len(new_days)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, days=self.days, covered_end=np.datetime64(self.covered_end, "D"))
+        os.replace(tmp_path, self.path)
+
+    def is_trading_day(self, dates):
+        dates = _days(dates)
+        if not len(self.days):
+            return np.zeros(dates.shape, dtype=bool)
+        idx = np.searchsorted(self.days, dates)
+        return (idx < len(self.days)) & (self.days[np.minimum(idx, len(self.days) - 1)] == dates)
+
+    def next_trading_day(self, dates, n=1):
+        """严格晚于 dates 的第 n 个交易日；超出日历范围为 NaT"""
+        idx = np.searchsorted(self.days, _days(dates), side="right") + (n - 1)
+        return self._take(idx)
+
+    def previous_trading_day(self, dates, n=1):
+        """严格早于 dates 的第 n 个交易日；超出日历范围为 NaT"""
+        idx = np.searchsorted(self.days, _days(dates), side="left") - n
+        return self._take(idx)
+
+    def last_trading_day(self, dates):
+        """不晚于 dates 的最近一个交易日（dates 本身是交易日时就是它）"""
+        idx = np.searchsorted(self.days, _days(dates), side="right") - 1
+        return self._take(idx)
+
+    def count(self, start_dates, end_dates):
+        """闭区间 [start, end] 内的交易日数"""
+        lo = np.searchsorted(self.days, _days(start_dates), side="left")
+        hi = np.searchsorted(self.days, _days(end_dates), side="right")
+        return np.maximum(hi - lo, 0)
+
+    def between(self, start_date, end_date):
+        """闭区间内的全部交易日"""
+        lo = np.searchsorted(self.days, _days(start_date), side="left")
+        hi = np.searchsorted(self.days, _days(end_date), side="right")
+        return self.days[lo:hi]
+
+    def align(self, dates):
+        """
+        日期对齐到日历：返回每个日期在日历中的位置，不是交易日的为 -1
+        用于把K线放进按交易日排列的数组
+        """
+        dates = _days(dates)
+        idx = np.searchsorted(self.days, dates)
+        return np.where(self.is_trading_day(dates), idx, -1)
+
+    def missing_days(self, dates, start_date=None, end_date=None):
+        """[start, end] 内有交易但 dates 中没有的日子（缺数据，而不是休市）"""
+        dates = _days(dates)
+        if start_date is None:
+            start_date = dates.min()
+        if end_date is None:
+            end_date = dates.max()
+        expected = self.between(start_date, end_date)
+        return expected[~np.isin(expected, dates)]
+
+    def _take(self, idx):
+        idx = np.asarray(idx)
+        ok = (idx >= 0) & (idx < len(self.days))
+        out = np.full(idx.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+        out[ok] = self.days[idx[ok]]
+        return out[()] if out.ndim == 0 else out
+
+
+def open_calendar(bar_dir=BAR_DIR, backend="bscache", refresh=True):
+    """
+    打开本地交易日历；refresh 时若没有覆盖到今天则联网补齐（每天最多一次查询）
+    联网失败时继续使用旧日历
+    """
+    calendar = TradingCalendar(bar_dir)
+    if refresh and calendar.stale():
+        bs = importlib.import_module(backend)
+        bs.login()
+        try:
+            calendar.refresh(bs)
+            calendar.save()
+        except RuntimeError as e:
+            print(f"交易日历更新失败，使用本地日历: {e}")
+        finally:
+            bs.logout()
+    return calendar
+
+
+if __name__ == "__main__":
+    calendar = open_calendar(backend=sys.argv[1] if len(sys.argv) > 1 else "bscache")
+    print(f"交易日历共 {len(calendar)} 个交易日，覆盖到 {calendar.covered_end}")
@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import importlib
+from datetime import date, timedelta
+import numpy as np
+
+UNIVERSE_DIR = "universe"
+INDEX_FILE = "index.npz"
+
+# 证券列表快照：每只证券一行（代码、名称、交易状态）
+SNAPSHOT_DTYPE = np.dtype([("code", "U9"), ("name", "U32"), ("status", "U1")])
+
+# 快照索引只保存变化：每行是一段 (代码, 名称, 状态) 不变的区间 [start, end)，
+# 几百个交易日的快照大小和一份快照加上变化行差不多；按日期查询是一次向量比较，不用读 JSON
+INDEX_DTYPE = np.dtype(SNAPSHOT_DTYPE.descr + [("start", "datetime64[D]"), ("end", "datetime64[D]")])
+OPEN_END = np.datetime64("9999-12-31", "D")
+
+
+def snapshot_from_rows(rows, fields):
+    """query_all_stock 结果集转快照数组（按代码排序）"""
+    snapshot = np.empty(len(rows), dtype=SNAPSHOT_DTYPE)
+    if rows:
+        columns = dict(zip(fields, zip(*rows)))
+        snapshot["code"] = columns["code"]
+        snapshot["name"] = columns["code_name"]
+        snapshot["status"] = columns["tradeStatus"]
+    return np.sort(snapshot, order="code")
+
+
+def snapshot_from_records(records):
+    """all_stock.json 这类记录列表转快照数组"""
+    return snapshot_from_rows([[r["code"], r["code_name"], r["tradeStatus"]] for r in records],
+                              ["code", "code_name", "tradeStatus"])
+
+
+def snapshot_to_records(snapshot):
+    return [{"code": str(s["code"]), "tradeStatus": str(s["status"]), "code_name": str(s["name"])}
+            for s in snapshot]
+
+
+def fetch_snapshot(bs, day=None, max_back=15):
+    """
+    查询某日的证券列表；非交易日 baostock 返回空结果，向前找最近的交易日
+    返回 (实际日期, 快照)
+    """
+    day = date.fromisoformat(day) if day else date.today()
+    for _ in range(max_back):
+        rs = bs.query_all_stock(day=day.isoformat())
+        if rs.error_code != '0':
+            raise RuntimeError(f"{rs.error_code} {rs.error_msg}")
+        rows = []
+        while (rs.error_code == '0') & rs.next():
+            rows.append(rs.get_row_data())
+        if rows:
+            return day.isoformat(), snapshot_from_rows(rows, rs.fields)
+        day -= timedelta(days=1)
+    raise RuntimeError(f"{max_back} 天内没有查到证券列表")
+
+
+def is_st(names):
+    """名称带 ST / *ST 标记（向量化）"""
+    return np.char.find(np.char.upper(np.asarray(names, dtype=str)), "ST") >= 0
+
+
+def diff_snapshots(old, new):
+    """
+    比较两份快照（都按代码排序），返回变化：
+        listed    新上市（新快照才有）
+        delisted  退市（旧快照才有）
+        renamed   改名 [(代码, 旧名, 新名)]，其中戴帽/摘帽另列在 st_changed
+        status    交易状态变化 [(代码, 旧状态, 新状态)]，例如停牌/复牌
+    """
+    common, i_old, i_new = np.intersect1d(old["code"], new["code"], assume_unique=True, return_indices=True)
+    o, n = old[i_old], new[i_new]
+    renamed = o["name"] != n["name"]
+    st_changed = renamed & (is_st(o["name"]) != is_st(n["name"]))
+    status = o["status"] != n["status"]
+    return {
+        "listed": new[~np.isin(new["code"], common)]["code"].tolist(),
+        "delisted": old[~np.isin(old["code"], common)]["code"].tolist(),
+        "renamed": list(zip(common[renamed].tolist(), o["name"][renamed].tolist(), n["name"][renamed].tolist())),
+        "st_changed": common[st_changed].tolist(),
+        "status": list(zip(common[status].tolist(), o["status"][status].tolist(), n["status"][status].tolist())),
+    }
+
+
+def changed_codes(diff):
+    """有任何变化的证券代码（排序去重），后续只需处理这些证券"""
+    codes = set(diff["listed"]) | set(diff["delisted"])
+    codes.update(code for code, _, _ in diff["renamed"])
+    codes.update(code for code, _, _ in diff["status"])
+    return sorted(codes)
+
+
+def print_diff(diff, old_day, new_day):
+    print(f"{old_day} -> {new_day}：新上市 {len(diff['listed'])}，退市 {len(diff['delisted'])}，"
+          f"改名 {len(diff['renamed'])}（其中戴帽/摘帽 {len(diff['st_changed'])}），"
+          f"交易状态变化 {len(diff['status'])}")
+    for code, old_name, new_name in diff["renamed"]:
+        print(f"  改名 {code}: {old_name} -> {new_name}")
+
+
+class UniverseIndex:
+    """按日期保存的证券列表快照索引（universe/index.npz）"""
+
+    def __init__(self, universe_dir=UNIVERSE_DIR):
+        self.path = os.path.join(universe_dir, INDEX_FILE)
+        self.rows = np.empty(0, dtype=INDEX_DTYPE)
+        self.days = np.empty(0, dtype="datetime64[D]")
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.rows = data["rows"]
+                self.days = data["days"]
+
+    def as_of(self, day=None):
+        """不晚于 day 的最近一份快照日期；没有返回 None"""
+        if not len(self.days):
+            return None
+        if day is None:
+            return self.days[-1]
+        i = np.searchsorted(self.days, np.datetime64(day, "D"), side="right") - 1
+        return self.days[i] if i >= 0 else None
+
+    def snapshot(self, day=None):
+        """某日（默认最新）的证券列表"""
+        day = self.as_of(day)
+        if day is None:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+        rows = self.rows[(self.rows["start"] <= day) & (day < self.rows["end"])]
+        snapshot = np.empty(len(rows), dtype=SNAPSHOT_DTYPE)
+        for name in SNAPSHOT_DTYPE.names:
+            snapshot[name] = rows[name]
+        return np.sort(snapshot, order="code")
+
+    def add(self, day, snapshot):
+        """加入一份快照；按日期追加时只关闭/新开变化的区间，插入到中间时整体重建"""
+        day = np.datetime64(day, "D")
+        if len(self.days) and day <= self.days[-1]:
+            snapshots = {d: self.snapshot(d) for d in self.days if d != day}
+            snapshots[day] = snapshot
+            self.rows = np.empty(0, dtype=INDEX_DTYPE)
+            self.days = np.empty(0, dtype="datetime64[D]")
+            for d in sorted(snapshots):
+                self._append(d, snapshots[d])
+        else:
+            self._append(day, snapshot)
+
+    def _append(self, day, snapshot):
+        snapshot = np.sort(snapshot, order="code")
+        current = np.flatnonzero(self.rows["end"] == OPEN_END)
+        key_old = np.char.add(np.char.add(self.rows["code"][current], self.rows["name"][current]),
+                              self.rows["status"][current])
+        key_new = np.char.add(np.char.add(snapshot["code"], snapshot["name"]), snapshot["status"])
+        unchanged = np.isin(key_old, key_new)
+        # 消失或变化的区间在这一天结束，新出现或变化的证券从这一天开新区间
+        self.rows["end"][current[~unchanged]] = day
+        added = snapshot[~np.isin(key_new, key_old)]
+        new_rows = np.empty(len(added), dtype=INDEX_DTYPE)
+        for name in SNAPSHOT_DTYPE.names:
+            new_rows[name] = added[name]
+        new_rows["start"] = day
+        new_rows["end"] = OPEN_END
+        self.rows = np.concatenate([self.rows, new_rows])
+        self.days = np.append(self.days, day)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez_compressed(tmp_path, rows=self.rows, days=self.days)
+        os.replace(tmp_path, self.path)
+
+
+def apply_renames(renamed, bar_dir=None):
+    """改名只需要改K线文件名和目录条目，不用重新下载"""
+    from barstore import BAR_DIR, bar_file_name, journal_path
+    from catalog import open_catalog
+
+    catalog = open_catalog(bar_dir or BAR_DIR)
+    count = 0
+    for code, _, new_name in renamed:
+        entry = catalog.lookup(code)
+        if entry is None:
+            continue
+        old_path = catalog.file_path(entry)
+        new_path = os.path.join(catalog.bar_dir, bar_file_name(new_name, code))
+        if os.path.exists(old_path) and old_path != new_path:
+            os.replace(old_path, new_path)
+            if os.path.exists(journal_path(old_path)):
+                os.replace(journal_path(old_path), journal_path(new_path))
+        entry["name"] = new_name
+        entry["file"] = os.path.basename(new_path)
+        count += 1
+    catalog.save()
+    return count
+
+
+def update_universe(day=None, backend="bscache", universe_dir=UNIVERSE_DIR):
+    """
+    取一份证券列表快照加入索引，与上一份比较，
+    把有变化的证券写到 universe/changes-<日期>.json（格式同 all_pure_stock.json，可直接交给下载脚本）
+    """
+    bs = importlib.import_module(backend)
+    bs.login()
+    try:
+        day, snapshot = fetch_snapshot(bs, day)
+    finally:
+        bs.logout()
+    index = UniverseIndex(universe_dir)
+    previous_day = index.as_of(np.datetime64(day, "D") - 1)
+    previous = index.snapshot(previous_day) if previous_day is not None else None
+    index.add(day, snapshot)
+    index.save()
+    print(f"已保存 {day} 的证券列表快照，共 {len(snapshot)} 只")
+    if previous is None:
+        return day, snapshot, None
+    diff = diff_snapshots(previous, snapshot)
+    print_diff(diff, previous_day, day)
+    names = dict(zip(snapshot["code"].tolist(), snapshot["name"].tolist()))
+    changes = [{"code": code, "code_name": names.get(code, "")} for code in changed_codes(diff)]
+    with open(os.path.join(universe_dir, f"changes-{day}.json"), "w", encoding="utf-8") as f:
+        json.dump(changes, f, ensure_ascii=False, indent=2)
+    return day, snapshot, diff
+
+
+def main(argv):
+    if argv[:1] == ["diff"]:
+        index = UniverseIndex()
+        old_day, new_day = index.as_of(argv[1]), index.as_of(argv[2] if len(argv) > 2 else None)
+        print_diff(diff_snapshots(index.snapshot(old_day), index.snapshot(new_day)), old_day, new_day)
+    else:
+        update_universe(argv[0] if argv else None)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
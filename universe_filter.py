@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import numpy as np
+from barstore import BAR_DIR, iter_bar_files
+from catalog import open_catalog
+from universe import UNIVERSE_DIR, UniverseIndex, is_st, snapshot_from_records
+
+RULES_FILE = "universe_rules.json"
+TRADABLE_FILE = os.path.join(UNIVERSE_DIR, "tradable.json")
+LEGACY_FILE = "all_pure_stock.json"  # 下载脚本读取的股票列表
+
+# 板块按代码前缀划分
+BOARD_PREFIXES = {
+    "index": ("sh.000", "sz.399"),
+    "sh_main": ("sh.600", "sh.601", "sh.603", "sh.605"),
+    "star": ("sh.688", "sh.689"),
+    "sz_main": ("sz.000", "sz.001", "sz.002", "sz.003"),
+    "chinext": ("sz.300", "sz.301", "sz.302"),
+    "bse": ("bj.",),
+    "b_share": ("sh.900", "sz.200"),
+}
+
+# 默认规则；universe_rules.json 中的同名项覆盖默认值，例如
+#     {"exclude_boards": ["star", "bse"], "min_listing_days": 120, "min_avg_amount": 50000000}
+DEFAULT_RULES = {
+    "exclude_indices": True,    # 去掉指数（sh.000xxx、sz.399xxx）
+    "exclude_st": True,         # 去掉 ST、*ST
+    "exclude_suspended": True,  # 去掉 tradeStatus 为 0（停牌）的证券
+    "exclude_boards": [],       # 去掉的板块，取值见 BOARD_PREFIXES
+    "min_listing_days": 0,      # 上市至今最少自然日数
+    "min_avg_amount": 0,        # 最近 amount_window 个交易日平均成交额下限（元）
+    "amount_window": 20,
+}
+
+
+def load_rules(path=RULES_FILE):
+    rules = dict(DEFAULT_RULES)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            rules.update(json.load(f))
+    return rules
+
+
+def board_of(codes):
+    """每个代码所属板块（向量化，不认识的前缀为 other）"""
+    codes = np.asarray(codes, dtype=str)
+    boards = np.full(len(codes), "other", dtype="U8")
+    for board, prefixes in BOARD_PREFIXES.items():
+        hit = np.zeros(len(codes), dtype=bool)
+        for prefix in prefixes:
+            hit |= np.char.startswith(codes, prefix)
+        boards[hit] = board
+    return boards
+
+
+def listing_dates(codes, catalog, index):
+    """
+    近似上市日期：本地K线第一天与证券首次出现在快照中的日期取较早者
+    快照日期只在晚于索引中最早的快照时才算上市日期（在后来的快照中才出现）；
+    第一次快照里就有的证券上市日期未知，只看本地K线
+    两者都没有时为 NaT（规则不排除，避免新股永远下载不到）
+    """
+    first = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[D]")
+    for i, code in enumerate(codes):
+        entry = catalog.entries.get(code)
+        if entry and entry["first_date"]:
+            first[i] = np.datetime64(entry["first_date"], "D")
+    if len(index.rows):
+        order = np.argsort(index.rows["code"], kind="stable")
+        seen_codes, starts = np.unique(index.rows["code"][order], return_index=True)
+        seen = np.minimum.reduceat(index.rows["start"][order], starts)
+        pos = np.searchsorted(seen_codes, codes)
+        found = (pos < len(seen_codes)) & (seen_codes[np.minimum(pos, len(seen_codes) - 1)] == codes)
+        seen_first = np.where(found, seen[np.minimum(pos, len(seen) - 1)], np.datetime64("NaT"))
+        seen_first[seen_first <= index.rows["start"].min()] = np.datetime64("NaT")
+        first = np.where(np.isnat(first) | (seen_first < first), seen_first, first)
+    return first
+
+
+def average_amounts(codes, catalog, window, bar_dir=BAR_DIR):
+    """
+    最近 window 个交易日的平均成交额：面板里有的股票一次切片算完，其余逐个读K线文件
+    没有本地数据的股票为 NaN
+    """
+    from barstore import load_tail
+    from panel import open_panel
+
+    amounts = np.full(len(codes), np.nan)
+    position = {code: i for i, code in enumerate(codes)}
+    done = set()
+    panel = open_panel()
+    if panel is not None and len(panel.dates):
+        with np.errstate(all="ignore"):
+            means = np.nanmean(panel.window("amount", window), axis=0)
+        for j, symbol in enumerate(panel.symbols):
+            entry = catalog.entry_for_file(symbol["file"])
+            if entry and entry["code"] in position:
+                amounts[position[entry["code"]]] = means[j]
+                done.add(entry["code"])
+    for code, i in position.items():
+        entry = catalog.entries.get(code)
+        if code not in done and entry and "amount" in entry["fields"]:
+            amounts[i] = np.nanmean(load_tail(catalog.file_path(entry), window)["amount"])
+    return amounts
+
+
+def apply_rules(snapshot, rules, day=None, bar_dir=BAR_DIR, universe_dir=UNIVERSE_DIR):
+    """
+    对快照中全部证券按规则一次性计算排除掩码
+    返回 (保留的快照行, {规则名: 该规则排除的数量})
+    """
+    codes = snapshot["code"]
+    excluded = {}
+    if rules["exclude_indices"]:
+        excluded["exclude_indices"] = board_of(codes) == "index"
+    if rules["exclude_st"]:
+        excluded["exclude_st"] = is_st(snapshot["name"])
+    if rules["exclude_suspended"]:
+        excluded["exclude_suspended"] = snapshot["status"] == "0"
+    if rules["exclude_boards"]:
+        excluded["exclude_boards"] = np.isin(board_of(codes), rules["exclude_boards"])
+    catalog = open_catalog(bar_dir)
+    if rules["min_listing_days"]:
+        first = listing_dates(codes, catalog, UniverseIndex(universe_dir))
+        today = np.datetime64(day, "D") if day else np.datetime64("today", "D")
+        age = (today - first).astype("timedelta64[D]").astype(np.float64)
+        age[np.isnat(first)] = np.inf
+        excluded["min_listing_days"] = age < rules["min_listing_days"]
+    if rules["min_avg_amount"]:
+        amounts = average_amounts(codes, catalog, rules["amount_window"], bar_dir)
+        excluded["min_avg_amount"] = ~np.isnan(amounts) & (amounts < rules["min_avg_amount"])
+    keep = np.ones(len(codes), dtype=bool)
+    for mask in excluded.values():
+        keep &= ~mask
+    return snapshot[keep], {name: int(mask.sum()) for name, mask in excluded.items()}
+
+
+def write_universe(selected, paths=(TRADABLE_FILE, LEGACY_FILE)):
+    """输出格式与 all_pure_stock.json 相同：[{"code": ..., "code_name": ...}]"""
+    stocks = [{"code": str(s["code"]), "code_name": str(s["name"])} for s in selected]
+    for path in paths:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stocks, f, ensure_ascii=False, indent=2)
+    return stocks
+
+
+def load_universe(path=TRADABLE_FILE):
+    """可交易证券代码集合；还没有生成过股票池时返回 None（表示不过滤）"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return {stock["code"] for stock in json.load(f)}
+
+
+def tradable_files(bar_dir=BAR_DIR):
+    """股票池内证券的K线文件；没有股票池时为全部K线文件"""
+    codes = load_universe()
+    if codes is None:
+        return iter_bar_files(bar_dir)
+    catalog = open_catalog(bar_dir)
+    files = [catalog.file_path(catalog.entries[code]) for code in codes if code in catalog.entries]
+    return sorted(path for path in files if os.path.exists(path))
+
+
+def build_universe(day=None, rules_path=RULES_FILE, bar_dir=BAR_DIR, universe_dir=UNIVERSE_DIR):
+    """用最新（或指定日期）的证券列表快照生成股票池；没有快照时读 all_stock.json"""
+    index = UniverseIndex(universe_dir)
+    snapshot = index.snapshot(day)
+    if not len(snapshot):
+        with open("all_stock.json", "r", encoding="utf-8") as f:
+            snapshot = snapshot_from_records(json.load(f))
+    rules = load_rules(rules_path)
+    selected, counts = apply_rules(snapshot, rules, day, bar_dir, universe_dir)
+    stocks = write_universe(selected)
+    print(f"原始证券数量: {len(snapshot)}")
+    for name, count in counts.items():
+        print(f"  {name}: 排除 {count}")
+    print(f"股票池数量: {len(stocks)}，已写入 {TRADABLE_FILE} 和 {LEGACY_FILE}")
+    return stocks
+
+
+if __name__ == "__main__":
+    build_universe(sys.argv[1] if len(sys.argv) > 1 else None)
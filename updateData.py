@@ -1,100 +1,161 @@
-import os
-import json
-import glob
-import baostock as bs
-import pandas as pd
+import time
 from datetime import datetime, timedelta
+from adjust import FACTOR_START, factors_from_rows, load_factors, write_factors
+from barstore import ADJUST_FORWARD, ADJUST_RAW, BAR_DIR, append_bars, bars_from_rows
+from bsclient import BaostockClient, DeadLetters, QueryError
+from catalog import open_catalog, rebuild_catalog
+from quality import QualityReport, check_bars
+from telemetry import Telemetry
+from trading_calendar import open_calendar
+from universe_filter import load_universe
+from watermarks import WatermarkTable
 
-DATA_DIR = "data"
+RATE = 10.0  # 每秒查询次数上限，出错时自动降速
 
-# 1. 检查一个data文件，获取最新日期
-def get_latest_date_from_any_file():
-    for file_path in glob.glob(os.path.join(DATA_DIR, "*.json")):
-        with open(file_path, "r", encoding="utf-8") as f:
-            stock_data = json.load(f)
-        if isinstance(stock_data, list) and stock_data:
-            last_date = stock_data[-1]["date"]
-            return last_date  # 格式如 '2024-06-01'
+# 1. 从股票目录中取一只股票的最新日期（不打开数据文件）
+def get_latest_date_from_any_file(catalog):
+    for entry in catalog:
+        if entry["last_date"]:
+            return entry["last_date"]  # 格式如 '2024-06-01'
     return None
 
 def get_today_str():
     return datetime.now().strftime("%Y-%m-%d")
 
-# 2. 获取股票列表
-def get_stock_list():
+# 2. 获取股票列表，并按每只股票的高水位确定需要补充的日期范围
+def get_stock_list(catalog, watermarks, today, calendar=None):
     stock_list = []
-    for file_path in glob.glob(os.path.join(DATA_DIR, "*.json")):
-        filename = os.path.basename(file_path)
-        if '-' in filename:
-            stock_name, stock_code = filename.replace('.json', '').rsplit('-', 1)
-        else:
-            stock_name = filename.replace('.json', '')
-            stock_code = ""
+    tradable = load_universe()  # 生成过股票池时只更新池内证券
+    for entry in catalog:
+        if tradable is not None and entry["code"] not in tradable:
+            continue
+        missing = watermarks.missing_range(entry, today, calendar)
+        if missing is None:
+            continue  # 已是最新，不查询也不读文件
         stock_list.append({
-            "file_path": file_path,
-            "stock_name": stock_name,
-            "stock_code": stock_code
+            "file_path": catalog.file_path(entry),
+            "stock_name": entry["name"],
+            "stock_code": entry["code"],
+            "last_date": entry["last_date"],
+            "adjust": entry.get("adjust", ADJUST_FORWARD),
+            "start_date": missing[0],
+            "end_date": missing[1]
         })
     return stock_list
 
-# 3. 获取并追加新数据
+def _days(start_date, end_date):
+    return (datetime.strptime(end_date, "%Y-%m-%d") - datetime.strptime(start_date, "%Y-%m-%d")).days + 1
+
+# 3. 查询一只股票的新数据并追加；K线查询重试用尽时抛出 QueryError
+def update_stock(client, stock, catalog, report, watermarks, today, telemetry):
+    file_path = stock["file_path"]
+    code = stock["stock_code"]
+    # 查询新数据（与已存数据相同的复权方式，旧的前复权文件继续追加前复权数据）
+    start = time.perf_counter()
+    try:
+        new_rows, fields = client.query_history_k_data_plus(
+            code,
+            "date,open,high,low,close",
+            start_date=stock["start_date"],
+            end_date=stock["end_date"],
+            frequency="d",
+            adjustflag=stock["adjust"]
+        )
+    finally:
+        for error_code in client.last_errors:
+            telemetry.count(f"error_{error_code}")
+    telemetry.observe("query_latency", time.perf_counter() - start)
+    telemetry.count("symbols")
+    if new_rows:
+        # 按目录中记录的最后日期去重，只追加新行，不读取历史数据
+        with telemetry.timer("convert"):
+            new_bars = bars_from_rows(new_rows, fields)
+        with telemetry.timer("validate"):
+            new_bars = check_bars(code, new_bars, report, append=True)
+        with telemetry.timer("append"):
+            appended = append_bars(stock["stock_name"], code, new_bars, stock["last_date"], catalog=catalog)
+        telemetry.count("rows_appended", appended)
+        if appended:
+            print(f"{file_path} 已追加 {appended} 条新数据")
+        else:
+            print(f"{file_path} 没有新数据可追加")
+    else:
+        print(f"{file_path} 没有获取到新数据")
+    if stock["adjust"] == ADJUST_RAW:
+        # 不复权存储的股票只需刷新复权因子，除权除息不用重新下载历史K线
+        try:
+            start = time.perf_counter()
+            factors = factors_from_rows(*client.query_adjust_factor(code, start_date=FACTOR_START))
+            telemetry.observe("factor_latency", time.perf_counter() - start)
+        except QueryError as e:
+            telemetry.count(f"error_{e.error_code}")
+            print(f"{file_path} 复权因子查询失败: {e}")
+        else:
+            # 整表比较：数据源修正历史因子时行数不变，只比行数会漏掉
+            old = load_factors(code)
+            if len(old) != len(factors) or not (old == factors).all():
+                write_factors(code, factors)
+                print(f"{file_path} 复权因子已更新")
+    watermarks.advance(catalog.entries[code], stock["end_date"], today)
+
+# 4. 获取并追加新数据
 def update_all_stocks():
-    latest_date = get_latest_date_from_any_file()
+    catalog = open_catalog(BAR_DIR)
+    if not len(catalog):
+        catalog = rebuild_catalog(BAR_DIR)
+    latest_date = get_latest_date_from_any_file(catalog)
     if not latest_date:
         print("未找到有效的data文件或数据为空！")
         return
     today = get_today_str()
-    print(f"将为所有股票补充 {latest_date} 到 {today} 的数据...")
-    lg = bs.login()
+    watermarks = WatermarkTable(BAR_DIR)
+    calendar = open_calendar(BAR_DIR)  # 本地交易日历，每天最多联网一次
+    stock_list = get_stock_list(catalog, watermarks, today, calendar)
+
+    # 与旧做法（所有股票统一从一个日期查到今天）比较节省的查询量
+    global_start = (datetime.strptime(latest_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    global_days = len(catalog) * max(_days(global_start, today), 0)
+    planned_days = sum(_days(stock["start_date"], stock["end_date"]) for stock in stock_list)
+    print(f"共 {len(catalog)} 只股票，{len(catalog) - len(stock_list)} 只已是最新（或不在股票池）直接跳过，需要查询 {len(stock_list)} 只")
+    print(f"查询日期跨度合计 {planned_days} 天，统一起点方式为 {global_days} 天，节省 {max(global_days - planned_days, 0)} 天")
+    if not stock_list:
+        return
+
+    report = QualityReport(BAR_DIR)
+    telemetry = Telemetry("updateData")
+    client = BaostockClient("baostock", rate=RATE)
+    lg = client.login()
     if lg.error_code != '0':
         print("baostock 登录失败：", lg.error_msg)
         return
+    dead_letters = DeadLetters()
     try:
-        stock_list = get_stock_list()
         for stock in stock_list:
-            file_path = stock["file_path"]
-            code = stock["stock_code"]
-            if not code:
-                continue
-            # 读取原有数据
-            with open(file_path, "r", encoding="utf-8") as f:
-                old_data = json.load(f)
-            # 查询新数据
-            rs = bs.query_history_k_data_plus(
-                code if '.' in code else f"sh.{code}",
-                "date,open,high,low,close",
-                start_date=(datetime.strptime(latest_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"),
-                end_date=today,
-                frequency="d",
-                adjustflag="2"
-            )
-            new_data = []
-            while (rs.error_code == '0') & rs.next():
-                row = rs.get_row_data()
-                # 字段顺序: date,open,high,low,close
-                new_data.append({
-                    "date": row[0],
-                    "open": row[1],
-                    "high": row[2],
-                    "low": row[3],
-                    "close": row[4]
-                })
-            if new_data:
-                # 检查去重
-                old_dates = set(item["date"] for item in old_data)
-                filtered_new = [item for item in new_data if item["date"] not in old_dates]
-                if filtered_new:
-                    all_data = old_data + filtered_new
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(all_data, f, ensure_ascii=False, indent=2)
-                    print(f"{file_path} 已追加 {len(filtered_new)} 条新数据")
-                else:
-                    print(f"{file_path} 没有新数据可追加")
-            else:
-                print(f"{file_path} 没有获取到新数据")
+            try:
+                update_stock(client, stock, catalog, report, watermarks, today, telemetry)
+            except QueryError as e:
+                dead_letters.add(stock, e)
+                print(f"{stock['file_path']} 查询失败，稍后重试: {e}")
+        if dead_letters:
+            # 全部股票处理完后再重试一轮失败的
+            print(f"重试 {len(dead_letters)} 只查询失败的股票")
+            for item in dead_letters.drain():
+                try:
+                    update_stock(client, item["task"], catalog, report, watermarks, today, telemetry)
+                    telemetry.count("dead_letters_recovered")
+                except QueryError as e:
+                    telemetry.count("failed")
+                    print(f"{item['task']['file_path']} 查询失败: {e}")
     finally:
-        bs.logout()
+        catalog.save()
+        report.save()
+        watermarks.save()
+        client.logout()
         print("baostock 已登出")
+        summary = telemetry.write()
+        latency = summary["histograms"].get("query_latency", {})
+        print(f"共查询 {summary['counters'].get('symbols', 0)} 只，耗时 {summary['elapsed']:.1f} 秒，"
+              f"查询延迟 p95={latency.get('p95', 0) * 1000:.0f}ms，指标已写入 telemetry/updateData-latest.json")
 
 if __name__ == "__main__":
     update_all_stocks()
@@ -5,8 +5,10 @@ import matplotlib.dates as mdates
 from datetime import datetime
 import seaborn as sns
 from fn_2 import SingleStockMomentumVolBreakoutStrategy
-import json
 import os
+from adjust import load_view
+from barstore import bars_to_frame
+from catalog import find_bar_file
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
@@ -21,19 +23,8 @@ class TradingVisualizer:
         
     def load_data(self):
         """加载股票数据"""
-        data_dir = "data"
-        matches = [f for f in os.listdir(data_dir) if self.stock_code in f and f.endswith('.json')]
-        if not matches:
-            raise FileNotFoundError(f'No data file found for code: {self.stock_code}')
-        
-        file_path = os.path.join(data_dir, matches[0])
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        for col in ('open', 'high', 'low', 'close'):
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        file_path = find_bar_file(self.stock_code)
+        df = bars_to_frame(load_view(file_path))
         
         df = df.dropna(subset=['open', 'high', 'low', 'close'])
         df = df[(df['date'] >= pd.to_datetime(self.start_date)) & 
@@ -0,0 +1,77 @@
+import os
+import json
+from datetime import datetime, timedelta
+import numpy as np
+from barstore import BAR_DIR
+
+WATERMARK_FILE = "watermarks.json"
+
+
+def _parse(date_str):
+    return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+class WatermarkTable:
+    """
+    每只股票的高水位：已确认查询过（无论是否有数据）的最后日期
+    与目录中的 last_date 取较大者，作为下次增量更新的起点
+    确认记录同时保存确认时目录中的 last_date 和 rows；文件被重写（例如重新全量下载）后二者对不上，
+    确认记录作废，避免把重写后缺失的日期当成已查询过
+    """
+
+    def __init__(self, bar_dir=BAR_DIR):
+        self.path = os.path.join(bar_dir, WATERMARK_FILE)
+        self.checked = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.checked = json.load(f)
+
+    def watermark(self, entry):
+        """股票的高水位日期（字符串），没有任何记录时返回 None"""
+        dates = [d for d in (entry.get("last_date"), self.checked_date(entry)) if d]
+        return max(dates) if dates else None
+
+    def checked_date(self, entry):
+        """仍然有效的确认日期；旧格式（只有日期）或与目录不一致时返回 None"""
+        item = self.checked.get(entry["code"])
+        if not isinstance(item, dict):
+            return None
+        if item["last_date"] != entry.get("last_date") or item["rows"] != entry.get("rows"):
+            return None
+        return item["date"]
+
+    def missing_range(self, entry, today, calendar=None):
+        """
+        需要补充的 (开始日期, 结束日期)；已是最新时返回 None
+        给出交易日历时按交易日计算：高水位之后到今天没有交易日（周末、节假日）就不用查询
+        """
+        watermark = self.watermark(entry)
+        if watermark is None:
+            return None
+        if calendar is not None and not calendar.stale(today):
+            start = calendar.next_trading_day(watermark)
+            end = calendar.last_trading_day(today)
+            if np.isnat(start) or np.isnat(end) or start > end:
+                return None
+            return str(start), str(end)
+        start = _parse(watermark) + timedelta(days=1)
+        end = _parse(today)
+        if start > end:
+            return None
+        return start.strftime("%Y-%m-%d"), today
+
+    def advance(self, entry, end_date, today):
+        """
+        查询 [.., end_date] 并追加完成后推进高水位，entry 为追加后的目录条目
+        当天的K线可能还没出来，所以最多只确认到昨天
+        """
+        yesterday = (_parse(today) - timedelta(days=1)).strftime("%Y-%m-%d")
+        checked = max(min(end_date, yesterday), self.checked_date(entry) or "")
+        self.checked[entry["code"]] = {"date": checked, "last_date": entry.get("last_date"),
+                                       "rows": entry.get("rows")}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checked, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)